@@ -16,11 +16,13 @@
         pythonEnv = python.withPackages (ps: with ps; [
           fastapi
           httpx
+          h2
+          certifi
           uvicorn
           python-dotenv
           openai
+          orjson
           numpy
-          pandas
           pyarrow
           python-crontab
           elevenlabs
@@ -1,6 +1,7 @@
 """Claude Code CLI wrapper for running conversations."""
 
 import asyncio
+import functools
 import json
 import os
 import time
@@ -10,14 +11,24 @@ from pathlib import Path
 from typing import Optional
 from zoneinfo import ZoneInfo
 
+import orjson
+
 from .memory import MemoryManager
+from .platform import get_platform
 from .session_logger import SessionLogger
 
 SESSION_TIMEOUT = 30 * 60  # 30 minutes
+VIENNA_TZ = ZoneInfo("Europe/Vienna")
+STREAM_LINE_LIMIT = 32 * 1024 * 1024  # max size of a single stream-json event
+RAW_OUTPUT_TAIL = 4096  # bytes of a successful result kept on ClaudeResponse.raw_output
+
+# Inherited by every claude subprocess, set once instead of copying os.environ per run
+os.environ.setdefault("CLAUDE_CODE_DISABLE_NONESSENTIAL_TRAFFIC", "1")
 
 
+@functools.lru_cache(maxsize=1)
 def find_claude_cli() -> Optional[str]:
-    """Find claude CLI in common locations."""
+    """Find claude CLI in common locations (cached; use find_claude_cli.cache_clear() to re-scan)."""
     home = os.environ.get("HOME", os.path.expanduser("~"))
     candidates = [
         os.path.join(home, ".local", "bin", "claude"),
@@ -49,7 +60,7 @@ class ClaudeResponse:
     session_id: Optional[str]
 
 
-# JSON schema for Claude's structured output
+# JSON schema for Claude's structured output (compact, it's passed as argv on every run)
 RESPONSE_SCHEMA = json.dumps({
     "type": "object",
     "properties": {
@@ -80,7 +91,15 @@ RESPONSE_SCHEMA = json.dumps({
         },
     },
     "required": ["response_text", "send_voice", "conversation_finished"],
-})
+}, separators=(",", ":"))
+
+# CLI flags shared by every run; per-call args are appended in ClaudeRunner.run
+BASE_CMD_ARGS = (
+    "--output-format", "stream-json", "--verbose",
+    "--json-schema", RESPONSE_SCHEMA,
+    "--permission-mode", "bypassPermissions",
+    "--disallowedTools", "Read(*.env*)", "Read(**/.env*)", "Bash(cat *.env*)", "Bash(cat **/.env*)", "Bash(rm -rf*)", "Bash(rm -r /*)",
+)
 
 
 class ClaudeRunner:
@@ -92,49 +111,53 @@ class ClaudeRunner:
         self.session_logger = SessionLogger(self.project_dir / "data" / "sessions")
         self.sessions_file = self.project_dir / "data" / "sessions.json"
         self.sessions_file.parent.mkdir(exist_ok=True)
+        # Session tracking lives in memory; the file is only read once here
+        self._sessions: dict = self._load_sessions()
+        self._sessions_lock = asyncio.Lock()
 
     def _load_sessions(self) -> dict:
         """Load session tracking data."""
         if self.sessions_file.exists():
-            return json.loads(self.sessions_file.read_text())
+            return orjson.loads(self.sessions_file.read_bytes())
         return {}
 
-    def _save_sessions(self, sessions: dict):
-        """Save session tracking data."""
-        self.sessions_file.write_text(json.dumps(sessions, indent=2))
+    async def _flush_sessions(self):
+        """Persist session tracking data without blocking the event loop."""
+        data = orjson.dumps(self._sessions)
+        await asyncio.to_thread(self.sessions_file.write_bytes, data)
 
-    def get_session_id(self, user_id: str) -> Optional[str]:
+    async def get_session_id(self, user_id: str) -> Optional[str]:
         """Get existing session ID for a user if not expired."""
-        sessions = self._load_sessions()
-        session_data = sessions.get(user_id, {})
+        async with self._sessions_lock:
+            session_data = self._sessions.get(user_id, {})
 
-        session_id = session_data.get("session_id")
-        last_activity = session_data.get("last_activity", 0)
+            session_id = session_data.get("session_id")
+            last_activity = session_data.get("last_activity", 0)
 
-        if not session_id:
-            return None
+            if not session_id:
+                return None
 
-        # Check if session has timed out (30 min)
-        if time.time() - last_activity > SESSION_TIMEOUT:
-            # Session expired, clear it
-            sessions.pop(user_id, None)
-            self._save_sessions(sessions)
-            return None
+            # Check if session has timed out (30 min)
+            if time.time() - last_activity > SESSION_TIMEOUT:
+                # Session expired, clear it
+                self._sessions.pop(user_id, None)
+                await self._flush_sessions()
+                return None
 
-        return session_id
+            return session_id
 
-    def update_session(self, user_id: str, session_id: str, finished: bool = False):
+    async def update_session(self, user_id: str, session_id: str, finished: bool = False):
         """Update session tracking for a user."""
-        sessions = self._load_sessions()
-        if finished:
-            # Clear session when conversation finishes
-            sessions.pop(user_id, None)
-        else:
-            sessions[user_id] = {
-                "session_id": session_id,
-                "last_activity": time.time(),
-            }
-        self._save_sessions(sessions)
+        async with self._sessions_lock:
+            if finished:
+                # Clear session when conversation finishes
+                self._sessions.pop(user_id, None)
+            else:
+                self._sessions[user_id] = {
+                    "session_id": session_id,
+                    "last_activity": time.time(),
+                }
+            await self._flush_sessions()
 
     async def run(
         self,
@@ -160,69 +183,84 @@ class ClaudeRunner:
             ClaudeResponse with structured output
         """
         # Get current Vienna time
-        vienna_tz = ZoneInfo("Europe/Vienna")
-        vienna_now = datetime.now(vienna_tz)
+        vienna_now = datetime.now(VIENNA_TZ)
         vienna_time_str = vienna_now.strftime("%Y-%m-%d %H:%M (%A)")
 
         # Build the prompt
-        from .platform import get_platform
-        prompt_parts = []
-        prompt_parts.append(f"[Platform: {get_platform().capitalize()}]")
-        if user_name:
-            prompt_parts.append(f"[User: {user_name}]")
-        prompt_parts.append(f"[Vienna time: {vienna_time_str}]")
-        if is_voice:
-            prompt_parts.append("[Voice message transcription]")
-        if image_path:
-            prompt_parts.append(f"[Image attached - use Read tool to view: {image_path}]")
-        if quoted_message:
-            prompt_parts.append(f"[Replying to: {quoted_message}]")
-        prompt_parts.append(f"\nMessage: {message}")
-
-        full_prompt = "\n".join(prompt_parts)
+        platform_name = get_platform().capitalize()
+        if user_name and not (is_voice or image_path or quoted_message):
+            # Fast path for the common case: plain message from a known user
+            full_prompt = (
+                f"[Platform: {platform_name}]\n[User: {user_name}]\n"
+                f"[Vienna time: {vienna_time_str}]\n\nMessage: {message}"
+            )
+        else:
+            prompt_parts = [f"[Platform: {platform_name}]"]
+            if user_name:
+                prompt_parts.append(f"[User: {user_name}]")
+            prompt_parts.append(f"[Vienna time: {vienna_time_str}]")
+            if is_voice:
+                prompt_parts.append("[Voice message transcription]")
+            if image_path:
+                prompt_parts.append(f"[Image attached - use Read tool to view: {image_path}]")
+            if quoted_message:
+                prompt_parts.append(f"[Replying to: {quoted_message}]")
+            prompt_parts.append(f"\nMessage: {message}")
+            full_prompt = "\n".join(prompt_parts)
 
         # Find claude CLI
         claude_path = find_claude_cli()
         if not claude_path:
+            # Don't cache the miss, the CLI may get installed while we're running
+            find_claude_cli.cache_clear()
             return ClaudeResponse(
                 response_text="sorry, claude cli not found on this system",
                 send_voice=False,
                 voice_text=None,
                 conversation_finished=False,
                 memories_to_save=[],
+                code_changes=False,
                 raw_output="",
                 session_id=None,
             )
 
         # Build CLI command
-        cmd = [
-            claude_path,
-            "-p", full_prompt,
-            "--output-format", "json",
-            "--json-schema", RESPONSE_SCHEMA,
-            "--permission-mode", "bypassPermissions",
-            "--disallowedTools", "Read(*.env*)", "Read(**/.env*)", "Bash(cat *.env*)", "Bash(cat **/.env*)", "Bash(rm -rf*)", "Bash(rm -r /*)",
-        ]
+        cmd = [claude_path, "-p", full_prompt, *BASE_CMD_ARGS]
 
         # Check for existing session
-        session_id = self.get_session_id(user_id)
+        session_id = await self.get_session_id(user_id)
         if session_id:
             cmd.extend(["--resume", session_id])
 
-        # Run Claude Code
+        # Run Claude Code. This is one process per message on purpose: the CLI
+        # has no server/socket mode to keep a worker alive, and continuity
+        # between messages already comes from --resume on the stored session.
         process = await asyncio.create_subprocess_exec(
             *cmd,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
             cwd=str(self.project_dir),
-            env={**os.environ, "CLAUDE_CODE_DISABLE_NONESSENTIAL_TRAFFIC": "1"},
+            limit=STREAM_LINE_LIMIT,
         )
 
-        stdout, stderr = await process.communicate()
+        # Drain stderr alongside stdout so a chatty CLI can't fill the pipe
+        stderr_task = asyncio.create_task(process.stderr.read())
+
+        # stream-json emits one event per line as the run progresses. Only the
+        # final "result" event carries the structured response, so every other
+        # line is dropped as soon as it's read instead of buffering all of it
+        result_line = b""
+        last_line = b""
+        async for line in process.stdout:
+            if b'"type":"result"' in line:
+                result_line = line
+            last_line = line
+        stderr = await stderr_task
+        await process.wait()
 
         if process.returncode != 0:
             error_msg = stderr.decode() if stderr else "Unknown error"
-            stdout_msg = stdout.decode() if stdout else ""
+            stdout_msg = (result_line or last_line).decode()
             import logging
             logging.getLogger("jarvis").error(f"Claude failed (code {process.returncode}): stderr={error_msg}, stdout={stdout_msg[:500]}")
             return ClaudeResponse(
@@ -231,25 +269,31 @@ class ClaudeRunner:
                 voice_text=None,
                 conversation_finished=False,
                 memories_to_save=[],
+                code_changes=False,
                 raw_output=error_msg,
                 session_id=None,
             )
 
-        # Parse output
-        raw_output = stdout.decode()
+        # Parse output straight from bytes, only decode fully when it isn't JSON
+        output_bytes = result_line or last_line
         try:
-            output = json.loads(raw_output)
-        except json.JSONDecodeError:
+            output = orjson.loads(output_bytes)
+        except orjson.JSONDecodeError:
+            raw_output = output_bytes.decode(errors="replace")
             return ClaudeResponse(
                 response_text=raw_output[:1000] if raw_output else "no response",
                 send_voice=False,
                 voice_text=None,
                 conversation_finished=False,
                 memories_to_save=[],
+                code_changes=False,
                 raw_output=raw_output,
                 session_id=None,
             )
 
+        # Nothing downstream needs the full output, keep a tail for postmortems
+        raw_output = output_bytes[-RAW_OUTPUT_TAIL:].decode(errors="replace")
+
         # Extract session ID from output if present
         new_session_id = output.get("session_id") or session_id
 
@@ -260,8 +304,8 @@ class ClaudeRunner:
                 result = {"response_text": "hmm, i didn't have anything to say", "send_voice": False, "conversation_finished": False}
             else:
                 try:
-                    result = json.loads(result)
-                except json.JSONDecodeError:
+                    result = orjson.loads(result)
+                except orjson.JSONDecodeError:
                     result = {"response_text": result, "send_voice": False, "conversation_finished": False}
 
         response = ClaudeResponse(
@@ -277,7 +321,7 @@ class ClaudeRunner:
 
         # Update session tracking
         if new_session_id:
-            self.update_session(user_id, new_session_id, response.conversation_finished)
+            await self.update_session(user_id, new_session_id, response.conversation_finished)
 
         # Log response (incoming message was already logged before Claude ran)
         self.session_logger.log_response(
@@ -292,9 +336,9 @@ class ClaudeRunner:
         # Keep all sessions permanently for chat history retrieval
         # (previously cleaned up after 3 days)
 
-        # Save memories if any
+        # Save memories if any (embedding calls block, keep them off the event loop)
         if response.memories_to_save:
             for memory in response.memories_to_save:
-                self.memory.save(memory)
+                await asyncio.to_thread(self.memory.save, memory)
 
         return response
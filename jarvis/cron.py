@@ -1,16 +1,51 @@
 """Cronjob management for scheduled tasks."""
 
+import shlex
+from contextlib import contextmanager
 from pathlib import Path
-from crontab import CronTab
+from crontab import CronItem, CronTab
+
+COMMENT_PREFIX = "jarvis:"
 
 
 class CronManager:
     """Manage user crontab for scheduled tasks."""
 
     def __init__(self):
-        self.cron = CronTab(user=True)
         self.project_root = Path(__file__).parent.parent.absolute()
         self.scripts_dir = self.project_root / "scripts"
+        self._batch_depth = 0
+        self._load()
+
+    def _load(self):
+        """Read the user crontab and index the Jarvis jobs in it."""
+        self.cron = CronTab(user=True)
+        # Jarvis jobs by task name, kept in sync by add_task/remove_task
+        self._by_name: dict[str, list[CronItem]] = {}
+        for job in self.cron:
+            if job.comment and job.comment.startswith(COMMENT_PREFIX):
+                self._by_name.setdefault(job.comment.removeprefix(COMMENT_PREFIX), []).append(job)
+
+    @contextmanager
+    def batch(self):
+        """Group several edits into a single crontab write on exit."""
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if self._batch_depth == 1:
+                # Nothing was written, drop the half-applied edits
+                self._load()
+            raise
+        finally:
+            self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self.cron.write()
+
+    def _write(self):
+        """Write the crontab unless a batch() is deferring it."""
+        if self._batch_depth == 0:
+            self.cron.write()
 
     def add_task(
         self,
@@ -32,46 +67,46 @@ class CronManager:
         Returns:
             Confirmation message
         """
-        # Remove existing job with same name
-        self.remove_task(name)
-
         # Use wrapper script that handles PATH and environment setup
         wrapper_script = self.scripts_dir / "run_cronjob.sh"
 
-        # Escape quotes in task description for shell
-        escaped_desc = task_description.replace('"', '\\"')
-        cmd = f'{wrapper_script} "{name}" "{escaped_desc}"'
+        # Quote for the shell, and escape % which cron would turn into a newline
+        cmd = f"{shlex.quote(str(wrapper_script))} {shlex.quote(name)} {shlex.quote(task_description)}"
         if one_shot:
             cmd += " --one-shot"
+        cmd = cmd.replace("%", "\\%")
 
-        job = self.cron.new(command=cmd, comment=f"jarvis:{name}")
-        job.setall(schedule)
+        with self.batch():
+            # Remove existing job with same name
+            self.remove_task(name)
+
+            job = self.cron.new(command=cmd, comment=f"{COMMENT_PREFIX}{name}")
+            job.setall(schedule)
+            self._by_name[name] = [job]
 
-        self.cron.write()
         return f"Scheduled task '{name}' with schedule: {schedule}"
 
     def remove_task(self, name: str) -> bool:
         """Remove a scheduled task by name."""
-        removed = False
-        for job in self.cron.find_comment(f"jarvis:{name}"):
-            self.cron.remove(job)
-            removed = True
-        self.cron.write()
-        return removed
+        jobs = self._by_name.pop(name, None)
+        if not jobs:
+            return False
+        self.cron.remove(*jobs)
+        self._write()
+        return True
 
     def list_tasks(self) -> list[dict]:
         """List all Jarvis scheduled tasks."""
-        tasks = []
-        for job in self.cron:
-            if job.comment and job.comment.startswith("jarvis:"):
-                name = job.comment.replace("jarvis:", "")
-                tasks.append({
-                    "name": name,
-                    "schedule": str(job.slices),
-                    "command": job.command,
-                    "enabled": job.is_enabled(),
-                })
-        return tasks
+        return [
+            {
+                "name": name,
+                "schedule": str(job.slices),
+                "command": job.command,
+                "enabled": job.is_enabled(),
+            }
+            for name, jobs in self._by_name.items()
+            for job in jobs
+        ]
 
     def setup_memory_cleanup(self):
         """Set up the daily memory cleanup cronjob."""
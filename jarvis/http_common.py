@@ -0,0 +1,10 @@
+"""Shared settings for the httpx clients."""
+
+import ssl
+
+import certifi
+
+# Built once and passed as verify= to every client, so the CA bundle is parsed
+# a single time per process (httpx would build a context per client). Same
+# certifi bundle httpx uses by default.
+SSL_CONTEXT = ssl.create_default_context(cafile=certifi.where())
@@ -1,11 +1,13 @@
 """FastAPI webhook server for messaging platforms (WhatsApp / Telegram)."""
 
+import asyncio
 import logging
 import os
-import tempfile
-from contextlib import asynccontextmanager
+from collections import OrderedDict
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 
+import orjson
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request, Response, HTTPException
 
@@ -32,15 +34,22 @@ client = None
 claude: ClaudeRunner
 voice: VoiceHandler
 message_store: MessageStore
+image_scratch_dir: Path
 
-# In-memory set for deduplication (prevents race conditions with parallel webhooks)
-_processing_messages: set[str] = set()
+# In-flight message IDs for deduplication (prevents race conditions with parallel webhooks).
+# Bounded LRU so IDs leaked by a crashed handler can't grow it forever.
+MAX_PROCESSING_MESSAGES = 10_000
+_processing_messages: OrderedDict[str, None] = OrderedDict()
+_processing_lock = asyncio.Lock()
+
+# Image scratch files currently handed to Claude (kept from cleanup)
+_scratch_in_use: set[Path] = set()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifecycle."""
-    global client, claude, voice, message_store
+    global client, claude, voice, message_store, image_scratch_dir
 
     # Initialize clients
     project_dir = Path(__file__).parent.parent
@@ -48,11 +57,21 @@ async def lifespan(app: FastAPI):
     claude = ClaudeRunner(project_dir)
     voice = VoiceHandler()
     message_store = MessageStore(project_dir / "data")
+    image_scratch_dir = project_dir / "data" / "img_scratch"
+    image_scratch_dir.mkdir(parents=True, exist_ok=True)
+    flusher = asyncio.create_task(message_store.run_flusher())
+    claude.session_logger.start()
 
     logger.info(f"Jarvis initialized on {platform} and ready")
     yield
 
     # Cleanup
+    flusher.cancel()
+    with suppress(asyncio.CancelledError):
+        await flusher
+    await message_store.flush()
+    message_store.close()
+    await claude.session_logger.stop()
     await client.close()
     logger.info("Jarvis shutdown complete")
 
@@ -97,32 +116,37 @@ async def handle_webhook(request: Request):
         logger.warning("Invalid webhook signature")
         raise HTTPException(status_code=403, detail="Invalid signature")
 
+    # Parse and process in background to respond quickly to webhook
+    asyncio.create_task(handle_webhook_body(body))
+
+    return {"status": "ok"}
+
+
+async def handle_webhook_body(body: bytes):
+    """Parse a verified webhook payload and process the message it carries."""
     # Parse the webhook payload
     try:
-        data = await request.json()
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid JSON")
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        logger.warning("Ignoring webhook with invalid JSON")
+        return
 
     # Extract message info
     message_info = client.parse_webhook_message(data)
     if not message_info:
         # Not a message event (could be status update, etc.)
-        return {"status": "ok"}
+        return
 
     # Telegram: only allow the configured user
     allowed_user = os.environ.get("USER_PHONE_NUMBER")
     if platform == "telegram" and allowed_user and message_info["from"] != allowed_user:
         logger.warning(f"Ignoring message from unauthorized user: {message_info['from']}")
-        return {"status": "ok"}
+        return
 
     logger.info(f"Received message from {message_info['name']} ({message_info['from']})")
     logger.info(f"Message info: type={message_info['type']}, text={message_info.get('text')}, image_id={message_info.get('image_id')}, audio_id={message_info.get('audio_id')}, reply_to={message_info.get('reply_to_message_id')}, reaction={message_info.get('reaction_emoji')}")
 
-    # Process in background to respond quickly to webhook
-    import asyncio
-    asyncio.create_task(process_message(message_info))
-
-    return {"status": "ok"}
+    await process_message(message_info)
 
 
 async def process_message(message_info: dict):
@@ -131,41 +155,51 @@ async def process_message(message_info: dict):
     user_name = message_info["name"]
     incoming_message_id = message_info.get("message_id")
 
-    # Deduplicate: use in-memory set to prevent race conditions
+    reply_to_id = message_info.get("reply_to_message_id")
+    reacted_to_id = message_info.get("reaction_message_id")
+
+    # The persistent dedup check and the reply/reaction context are independent
+    # lookups, so they're answered by one batched read off the event loop
+    lookup_ids = [i for i in (incoming_message_id, reply_to_id, reacted_to_id) if i]
+    stored = {}
+
+    # Deduplicate: use in-memory LRU to prevent race conditions
     # The old check (message_store.is_processed) had a race condition:
     # two parallel requests could both pass the check before either stored
     if incoming_message_id:
-        if incoming_message_id in _processing_messages:
-            logger.info(f"Skipping duplicate message (in-flight): {incoming_message_id}")
-            return
-        # Also check persistent store for messages from previous server runs
-        if message_store.is_processed(incoming_message_id):
-            logger.info(f"Skipping duplicate message (already processed): {incoming_message_id}")
-            return
-        # Mark as processing IMMEDIATELY to prevent race conditions
-        _processing_messages.add(incoming_message_id)
+        async with _processing_lock:
+            if incoming_message_id in _processing_messages:
+                logger.info(f"Skipping duplicate message (in-flight): {incoming_message_id}")
+                return
+            stored = await asyncio.to_thread(message_store.get_many, lookup_ids)
+            # Also check persistent store for messages from previous server runs
+            if incoming_message_id in stored:
+                logger.info(f"Skipping duplicate message (already processed): {incoming_message_id}")
+                return
+            # Mark as processing IMMEDIATELY to prevent race conditions
+            _processing_messages[incoming_message_id] = None
+            if len(_processing_messages) > MAX_PROCESSING_MESSAGES:
+                _processing_messages.popitem(last=False)
+    elif lookup_ids:
+        stored = await asyncio.to_thread(message_store.get_many, lookup_ids)
 
     # Check if this is a reply to another message
     quoted_message = None
-    if reply_to_id := message_info.get("reply_to_message_id"):
-        stored = message_store.get(reply_to_id)
-        if stored:
-            quoted_message = stored["content"]
-            logger.info(f"Reply to message: {quoted_message[:50]}...")
+    if reply_to_id and reply_to_id in stored:
+        quoted_message = stored[reply_to_id]["content"]
+        logger.info(f"Reply to message: {quoted_message[:50]}...")
 
     image_path = None
+    scratch_path = None
     try:
         # Handle different message types: reaction, voice, text, image
         if message_info["type"] == "reaction" and message_info.get("reaction_emoji"):
             logger.info("Processing reaction message")
             # Get the message that was reacted to
-            reacted_to_id = message_info.get("reaction_message_id")
             reacted_to_content = None
-            if reacted_to_id:
-                stored = message_store.get(reacted_to_id)
-                if stored:
-                    reacted_to_content = stored["content"]
-                    logger.info(f"Reaction to message: {reacted_to_content[:50]}...")
+            if reacted_to_id and reacted_to_id in stored:
+                reacted_to_content = stored[reacted_to_id]["content"]
+                logger.info(f"Reaction to message: {reacted_to_content[:50]}...")
 
             emoji = message_info["reaction_emoji"]
             if reacted_to_content:
@@ -175,25 +209,41 @@ async def process_message(message_info: dict):
             is_voice = False
         elif message_info["type"] == "audio" and message_info["audio_id"]:
             logger.info("Processing voice message")
-            # Download and transcribe audio
-            audio_data, content_type = await client.download_media(message_info["audio_id"])
-            user_message = await voice.transcribe(audio_data, content_type)
+            # Download (streamed to disk) and transcribe audio
+            # the transcription API goes by the extension; .ogg covers WhatsApp/Telegram voice notes
+            audio_path, content_type = await client.download_media_to_file(
+                message_info["audio_id"], default_suffix=".ogg"
+            )
+            try:
+                user_message = await voice.transcribe_file(audio_path)
+            finally:
+                Path(audio_path).unlink(missing_ok=True)
             is_voice = True
             logger.info(f"Transcribed: {user_message[:100]}...")
         elif message_info["type"] == "image" and message_info["image_id"]:
             logger.info("Processing image message")
-            # Download image and save to temp file
-            image_data, content_type = await client.download_media(message_info["image_id"])
+            # Stream the image to disk for Claude to read
+            image_path, content_type = await client.download_media_to_file(
+                message_info["image_id"], image_scratch_dir
+            )
             # Determine extension from content type
             ext = ".jpg"
             if "png" in content_type:
                 ext = ".png"
             elif "webp" in content_type:
                 ext = ".webp"
-            # Save to temp file
-            with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as f:
-                f.write(image_data)
-                image_path = f.name
+            # Move it onto a scratch file named by message, so a resumed session
+            # never reads a newer image through an older turn's path; this
+            # user's earlier scratch files go unless they're still being looked at
+            image_key = incoming_message_id or message_info["image_id"]
+            scratch = image_scratch_dir / f"{user_id}_{image_key}{ext}"
+            for previous in image_scratch_dir.glob(f"{user_id}_*"):
+                if previous not in _scratch_in_use:
+                    previous.unlink(missing_ok=True)
+            _scratch_in_use.add(scratch)
+            scratch_path = scratch
+            os.replace(image_path, scratch)
+            image_path = str(scratch)
             logger.info(f"Saved image to {image_path}")
             # Use caption as message, or generic prompt if no caption
             user_message = message_info.get("image_caption") or "what do you see in this image?"
@@ -208,7 +258,7 @@ async def process_message(message_info: dict):
 
         # Store incoming message for future reply context lookups
         if incoming_message_id:
-            message_store.store(incoming_message_id, user_message, user_name or user_id)
+            await message_store.store_async(incoming_message_id, user_message, user_name or user_id)
 
         # Log incoming message to session immediately (so it's visible even if Claude hangs)
         claude.session_logger.log_incoming(user_id, user_name or "user", user_message, is_voice)
@@ -229,32 +279,15 @@ async def process_message(message_info: dict):
 
         # Send response
         if response.send_voice and response.voice_text:
-            logger.info("Generating voice response")
-            # Generate TTS
-            _, audio_path = await voice.text_to_speech(response.voice_text)
-
-            try:
-                send_result = await client.send_audio_file(user_id, audio_path)
-                # Store outgoing voice message for reply context
-                if msg_id := send_result.get("messages", [{}])[0].get("id"):
-                    message_store.store(msg_id, f"[voice] {response.voice_text}", "jarvis")
-                logger.info("Voice response sent")
-            finally:
-                # Cleanup temp file
-                Path(audio_path).unlink(missing_ok=True)
-
-            # Also send text if it's different from voice text
+            sends = [send_voice_response(user_id, response.voice_text)]
+            # Also send text if it's different from voice text (runs while TTS is generating)
             if response.response_text and response.response_text != response.voice_text:
-                send_result = await client.send_text(user_id, response.response_text)
-                if msg_id := send_result.get("messages", [{}])[0].get("id"):
-                    message_store.store(msg_id, response.response_text, "jarvis")
+                sends.append(send_text_response(user_id, response.response_text))
+            await asyncio.gather(*sends)
         else:
             # Send text response
             if response.response_text:
-                send_result = await client.send_text(user_id, response.response_text)
-                # Store outgoing message for reply context
-                if msg_id := send_result.get("messages", [{}])[0].get("id"):
-                    message_store.store(msg_id, response.response_text, "jarvis")
+                await send_text_response(user_id, response.response_text)
                 logger.info("Text response sent")
             else:
                 logger.info("No response text to send (intentional silence)")
@@ -262,7 +295,13 @@ async def process_message(message_info: dict):
         # Restart if code changes were made (after response is sent)
         if needs_restart:
             logger.info("Code changes detected, exiting for systemd restart")
-            os._exit(0)
+            # os._exit skips shutdown, so write out buffered messages and
+            # queued session logs first, but restart even if that fails
+            try:
+                await message_store.flush()
+                await claude.session_logger.stop()
+            finally:
+                os._exit(0)
 
     except Exception as e:
         logger.exception(f"Error processing message: {e}")
@@ -274,12 +313,38 @@ async def process_message(message_info: dict):
         except Exception:
             logger.exception("Failed to send error message")
     finally:
-        # Clean up temp image file if created
-        if image_path:
+        # Release the scratch file (kept until the next image) or clean up the temp image
+        if scratch_path:
+            _scratch_in_use.discard(scratch_path)
+        elif image_path:
             Path(image_path).unlink(missing_ok=True)
-        # Remove from in-flight set (keep in message_store for reply context)
+        # Remove from in-flight LRU (keep in message_store for reply context)
         if incoming_message_id:
-            _processing_messages.discard(incoming_message_id)
+            _processing_messages.pop(incoming_message_id, None)
+
+
+async def send_voice_response(user_id: str, voice_text: str):
+    """Generate TTS for voice_text and send it as a voice message."""
+    logger.info("Generating voice response")
+    _, audio_path = await voice.text_to_speech(voice_text)
+
+    try:
+        send_result = await client.send_audio_file(user_id, audio_path)
+        # Store outgoing voice message for reply context
+        if msg_id := send_result.get("messages", [{}])[0].get("id"):
+            await message_store.store_async(msg_id, f"[voice] {voice_text}", "jarvis")
+        logger.info("Voice response sent")
+    finally:
+        # Cleanup temp file
+        Path(audio_path).unlink(missing_ok=True)
+
+
+async def send_text_response(user_id: str, text: str):
+    """Send a text message and remember it for reply context."""
+    send_result = await client.send_text(user_id, text)
+    # Store outgoing message for reply context
+    if msg_id := send_result.get("messages", [{}])[0].get("id"):
+        await message_store.store_async(msg_id, text, "jarvis")
 
 
 @app.get("/health")
@@ -299,6 +364,8 @@ def main():
         "jarvis.main:app",
         host=host,
         port=port,
+        loop="uvloop",
+        http="httptools",
         reload=os.environ.get("DEBUG", "").lower() == "true",
     )
 
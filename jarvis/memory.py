@@ -1,22 +1,66 @@
 """Memory management with semantic embeddings and chunked parquet storage."""
 
+import atexit
+import base64
+import json
+import os
+import pickle
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
+import httpx
 import numpy as np
-import pandas as pd
-from openai import OpenAI
+import pyarrow as pa
+import pyarrow.parquet as pq
+from openai import DefaultHttpxClient, OpenAI
+
+from .http_common import SSL_CONTEXT
+
+# Parquet schemas, given explicitly so empty stores still write typed columns
+MEMORIES_SCHEMA = pa.schema([("id", pa.string()), ("content", pa.string()), ("created_at", pa.string())])
+CHUNKS_SCHEMA = pa.schema([("memory_id", pa.string()), ("chunk_index", pa.int64()), ("chunk_text", pa.string())])
+
+try:
+    import simsimd
+except ImportError:  # optional SIMD kernels, NumPy is the fallback
+    simsimd = None
+
+try:
+    import faiss
+except ImportError:  # optional ANN index for large stores, exact scan otherwise
+    faiss = None
 
 EMBEDDING_MODEL = "text-embedding-3-large"
 EMBEDDING_DIM = 3072
+EMBED_BATCH_SIZE = 64  # texts per embeddings request
+EMBED_CONCURRENCY = 5  # embeddings requests in flight at once
 SIMILARITY_THRESHOLD = 0.3
 MIN_RESULTS = 3
+MIN_EMB_CAPACITY = 64  # initial rows allocated for the embedding matrix
+NORMALIZED_KEY = b"jarvis.normalized"  # parquet metadata flag: embeddings are unit-norm
+GENERATION_KEY = b"jarvis.generation"  # memories.parquet metadata: which chunk files go with it
+EPOCH_KEY = b"jarvis.epoch"  # memories.parquet metadata: generation since which rows were only appended
+LOAD_ATTEMPTS = 5  # reads of a store whose files change underneath (a flush in another process)
+LOAD_RETRY_DELAY = 0.05  # seconds between those reads
+RERANK_TOP_K = 50  # int8 candidates re-scored with the exact float32 embeddings
+FLUSH_DELAY = 5.0  # seconds after a change before parquet/npy files are rewritten
+QUERY_CACHE_SIZE = 1024  # query embeddings kept (12 KB each)
+ANN_MIN_CHUNKS = 10_000  # below this many chunks search stays an exact scan
+ANN_HNSW_M = 32  # HNSW graph degree
+ANN_EF_CONSTRUCTION = 200  # HNSW candidate list size while building (faiss default 40)
+ANN_EF_SEARCH = 128  # HNSW candidate list size per search, at least 2x the results asked for
+ANN_SAVE_ROWS = 256  # rows added to a loaded index before it is written back
 
 # Chunking params
 CHUNK_SIZE = 250  # target chars per chunk
 CHUNK_OVERLAP = 50  # overlap between chunks
+_SENTENCE_RE = re.compile(r'(?<=[.!?\n])\s+')
 
 
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
@@ -25,7 +69,7 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVE
         return [text]
 
     # split into sentences (roughly)
-    sentences = re.split(r'(?<=[.!?\n])\s+', text)
+    sentences = _SENTENCE_RE.split(text)
 
     chunks = []
     current_chunk = ""
@@ -55,127 +99,488 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVE
     return chunks if chunks else [text]
 
 
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize vectors along the last axis, in place."""
+    vectors /= np.linalg.norm(vectors, axis=-1, keepdims=True) + 1e-12
+    return vectors
+
+
+def quantize(vectors: np.ndarray) -> np.ndarray:
+    """Symmetric int8 quantization, scaled per row to use the full range (cosine ignores the scale)."""
+    scale = 127.0 / (np.abs(vectors).max(axis=-1, keepdims=True) + 1e-12)
+    return np.round(vectors * scale).astype(np.int8)
+
+
+def similarities(matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every row of matrix against query (both unit-norm)."""
+    if simsimd is not None and len(matrix) > 0:
+        try:
+            return np.asarray(simsimd.cdist(matrix, query[None, :], metric="dot")).ravel()
+        except (TypeError, ValueError):
+            pass
+    return matrix @ query
+
+
+def approx_similarities(matrix_i8: np.ndarray, query_i8: np.ndarray) -> Optional[np.ndarray]:
+    """Approximate cosine similarity on int8 embeddings, None without SimSIMD."""
+    if simsimd is None or len(matrix_i8) == 0:
+        return None
+    try:
+        return 1.0 - np.asarray(simsimd.cdist(matrix_i8, query_i8[None, :], metric="cosine")).ravel()
+    except (TypeError, ValueError):
+        return None
+
+
 class MemoryManager:
     """Manage semantic memories with chunk-based embeddings."""
 
     def __init__(self, data_dir: str = "data"):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
+        # memories.parquet is written last on every flush and names the generation
+        # of chunk files (see _chunk_paths) that belongs to it
         self.memories_path = self.data_dir / "memories.parquet"
-        self.chunks_path = self.data_dir / "chunks.parquet"
-        self.client = OpenAI()
-        self._memories: Optional[pd.DataFrame] = None
-        self._chunks: Optional[pd.DataFrame] = None
+        self._generation: Optional[int] = None
+        # Rows have only been appended since this generation; None until the next
+        # flush once rows are deleted. The HNSW index file is kept per epoch.
+        self._epoch: Optional[int] = None
+        # One pooled HTTP/2 connection set for every embeddings request, sized for
+        # the concurrent sub-batches in _embed_batch
+        self.client = OpenAI(http_client=DefaultHttpxClient(
+            http2=True,
+            verify=SSL_CONTEXT,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+        ))
+        # Rows are kept as plain dicts (memories by id) and only turned into
+        # Arrow tables on _save()
+        self._memories: Optional[dict[str, dict]] = None
+        self._chunk_rows: Optional[list[dict]] = None
+        # Embedding matrix with spare capacity; rows [:_emb_len] are valid. Right
+        # after load it's a read-only memmap of the .npy file, copied on first append.
+        # The int8 copy is what search scans; float32 is only read to re-rank.
         self._chunk_embeddings: Optional[np.ndarray] = None
+        self._chunk_embeddings_i8: Optional[np.ndarray] = None
+        self._emb_len = 0
+        # chunk -> memory code array and the memory ids it indexes, rebuilt after changes
+        self._codes_cache: Optional[tuple[np.ndarray, np.ndarray]] = None
+        # HNSW index over the embeddings once the store passes ANN_MIN_CHUNKS, read
+        # (or built) on the first large search
+        self._index = None
+        # Changes are logged to the WAL right away and written to the data
+        # files by a debounced background flush (and at exit)
+        self.wal_path = self.data_dir / "memory_wal.jsonl"
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
+        atexit.register(self.flush)
+        # LRU of query -> float32 embedding bytes. With MEMORY_QUERY_CACHE=true it is
+        # also kept on disk, so repeated searches from short-lived processes hit it
+        self.query_cache_path = self.data_dir / "query_cache.pkl"
+        self._query_cache: OrderedDict[str, bytes] = OrderedDict()
+        self._persist_query_cache = os.environ.get("MEMORY_QUERY_CACHE", "").lower() == "true"
+        if self._persist_query_cache:
+            self._load_query_cache()
+            atexit.register(self._save_query_cache)
+
+    @property
+    def _embeddings(self) -> np.ndarray:
+        """View of the valid rows of the embedding matrix."""
+        return self._chunk_embeddings[:self._emb_len]
+
+    @property
+    def _embeddings_i8(self) -> np.ndarray:
+        """View of the valid rows of the int8 embedding matrix."""
+        return self._chunk_embeddings_i8[:self._emb_len]
+
+    def _set_embeddings(self, matrix: np.ndarray):
+        """Replace the embedding matrices, leaving room to grow."""
+        self._emb_len = len(matrix)
+        capacity = max(self._emb_len, MIN_EMB_CAPACITY)
+        self._chunk_embeddings = np.empty((capacity, EMBEDDING_DIM), dtype=np.float32)
+        self._chunk_embeddings[:self._emb_len] = matrix
+        self._chunk_embeddings_i8 = np.empty((capacity, EMBEDDING_DIM), dtype=np.int8)
+        self._chunk_embeddings_i8[:self._emb_len] = quantize(matrix)
+
+    def _append_embeddings(self, new: np.ndarray):
+        """Append rows, doubling capacity when full (amortized O(1) per row)."""
+        needed = self._emb_len + len(new)
+        if needed > len(self._chunk_embeddings):
+            capacity = max(2 * len(self._chunk_embeddings), needed)
+            grown = np.empty((capacity, EMBEDDING_DIM), dtype=np.float32)
+            grown[:self._emb_len] = self._embeddings
+            self._chunk_embeddings = grown
+            grown_i8 = np.empty((capacity, EMBEDDING_DIM), dtype=np.int8)
+            grown_i8[:self._emb_len] = self._embeddings_i8
+            self._chunk_embeddings_i8 = grown_i8
+        self._chunk_embeddings[self._emb_len:needed] = new
+        self._chunk_embeddings_i8[self._emb_len:needed] = quantize(new)
+        self._emb_len = needed
+
+    def _memory_codes(self) -> tuple[np.ndarray, np.ndarray]:
+        """Integer memory code per chunk row, plus the memory id of each code."""
+        if self._codes_cache is None:
+            memory_ids, codes = np.unique(
+                np.array([c["memory_id"] for c in self._chunk_rows], dtype=object), return_inverse=True
+            )
+            self._codes_cache = (codes.astype(np.int32), memory_ids)
+        return self._codes_cache
+
+    @property
+    def _index_path(self) -> Optional[Path]:
+        """HNSW index file of the current epoch, None before the rows have one."""
+        if self._epoch is None:
+            return None
+        return self.data_dir / f"chunk_index.{self._epoch}.faiss"
+
+    def _ann_index(self):
+        """HNSW index over the embeddings, or None for small stores / without faiss."""
+        if faiss is None or self._emb_len <= ANN_MIN_CHUNKS:
+            return None
+        with self._lock:
+            if self._index is None and (path := self._index_path) is not None and path.exists():
+                self._index = faiss.read_index(str(path))
+                if self._index.ntotal > self._emb_len:
+                    self._index = None  # written by a process that had rows not yet flushed
+            built = self._index is None
+            if built:
+                self._index = faiss.IndexHNSWFlat(EMBEDDING_DIM, ANN_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+                self._index.hnsw.efConstruction = ANN_EF_CONSTRUCTION
+            # rows saved since the file was written (the saving process doesn't
+            # search, so it never loads the index) are just added
+            added = self._emb_len - self._index.ntotal
+            if added:
+                self._index.add(np.ascontiguousarray(self._embeddings[self._index.ntotal:], dtype=np.float32))
+            if built or added >= ANN_SAVE_ROWS:
+                # building is the slow part, so keep it for the next process
+                self._save_index()
+            return self._index
 
     def _load(self):
-        """Load memories and chunks from parquet."""
-        if self._memories is not None:
-            return
+        """Load memories and chunks from parquet, then replay the WAL."""
+        with self._lock:
+            if self._memories is None:
+                self._load_files()
+                self._replay_wal()
+
+    def _chunk_paths(self, generation: Optional[int]) -> tuple[Path, Path, Path]:
+        """Chunks parquet and float32/int8 embedding files of a generation (None: unversioned names)."""
+        suffix = "" if generation is None else f".{generation}"
+        return (
+            self.data_dir / f"chunks{suffix}.parquet",
+            self.data_dir / f"chunk_embeddings{suffix}.npy",
+            self.data_dir / f"chunk_embeddings_i8{suffix}.npy",
+        )
 
+    def _load_files(self):
+        """Load memories and chunks, retrying while another process is mid-flush."""
+        for attempt in range(LOAD_ATTEMPTS):
+            try:
+                if self._read_files():
+                    return
+            except FileNotFoundError:
+                # a newer generation was published and this one removed
+                if attempt == LOAD_ATTEMPTS - 1:
+                    raise
+            time.sleep(LOAD_RETRY_DELAY)
+        # unversioned files left mismatched by an interrupted flush: keep the rows
+        # that still line up, the WAL replay re-adds what it has
+        self._align_rows()
+
+    def _read_files(self) -> bool:
+        """Read memories.parquet and its chunk files. False if their row counts differ."""
         # load memories
+        generation = self._epoch = None
         if self.memories_path.exists():
-            self._memories = pd.read_parquet(self.memories_path)
+            table = pq.read_table(self.memories_path)
+            self._memories = {m["id"]: m for m in table.to_pylist()}
+            metadata = table.schema.metadata or {}
+            if (value := metadata.get(GENERATION_KEY)) is not None:
+                generation = int(value)
+            if (value := metadata.get(EPOCH_KEY)) is not None:
+                self._epoch = int(value)
         else:
-            self._memories = pd.DataFrame(columns=["id", "content", "created_at"])
-
-        # load chunks
-        if self.chunks_path.exists():
-            self._chunks = pd.read_parquet(self.chunks_path)
-            if len(self._chunks) > 0:
-                self._chunk_embeddings = np.vstack(self._chunks["embedding"].values)
+            self._memories = {}
+        self._generation = generation
+        chunks_path, embeddings_path, quantized_path = self._chunk_paths(generation)
+
+        # load chunks; embeddings live in their own .npy file, aligned by row order.
+        # A published generation always has both, so a missing one raises here
+        published = generation is not None
+        if published or chunks_path.exists():
+            table = pq.read_table(chunks_path)
+            self._chunk_rows = table.select(CHUNKS_SCHEMA.names).to_pylist()
+            if "embedding" in table.column_names:
+                # one-time migration from the old per-row embedding column
+                if table.num_rows > 0:
+                    self._set_embeddings(np.array(table.column("embedding").to_pylist(), dtype=np.float32))
+                else:
+                    self._set_embeddings(np.zeros((0, EMBEDDING_DIM), dtype=np.float32))
+                if (table.schema.metadata or {}).get(NORMALIZED_KEY) != b"1":
+                    normalize(self._embeddings)
+                self._save()
+            elif published or embeddings_path.exists():
+                # let the OS page the matrix in lazily instead of reading it all up front
+                self._chunk_embeddings = np.load(embeddings_path, mmap_mode="r")
+                self._emb_len = len(self._chunk_embeddings)
+                if quantized_path.exists():
+                    self._chunk_embeddings_i8 = np.load(quantized_path, mmap_mode="r")
+                else:
+                    self._chunk_embeddings_i8 = quantize(self._chunk_embeddings)
+                if len(self._chunk_rows) != self._emb_len or len(self._chunk_embeddings_i8) != self._emb_len:
+                    return False
             else:
-                self._chunk_embeddings = np.zeros((0, EMBEDDING_DIM))
+                self._set_embeddings(np.zeros((0, EMBEDDING_DIM), dtype=np.float32))
         else:
-            self._chunks = pd.DataFrame(columns=["memory_id", "chunk_index", "chunk_text", "embedding"])
-            self._chunk_embeddings = np.zeros((0, EMBEDDING_DIM))
+            self._chunk_rows = []
+            self._set_embeddings(np.zeros((0, EMBEDDING_DIM), dtype=np.float32))
+        return True
+
+    def _align_rows(self):
+        """Cut chunk rows and embeddings to the rows they share, minus chunks of unknown memories."""
+        rows = min(len(self._chunk_rows), self._emb_len)
+        keep = np.array([c["memory_id"] in self._memories for c in self._chunk_rows[:rows]], dtype=bool)
+        self._chunk_rows = [c for c, k in zip(self._chunk_rows, keep) if k]
+        self._set_embeddings(self._chunk_embeddings[:rows][keep])
+        self._index = None
+        self._epoch = None
+
+    def _replay_wal(self):
+        """Re-apply changes logged after the last successful flush."""
+        if not self.wal_path.exists():
+            return
+        replayed = False
+        # a save counts as flushed once its chunks are on disk; memories.parquet
+        # is written last, so it can lag behind them after a crash in _save()
+        flushed = {row["memory_id"] for row in self._chunk_rows}
+        for line in self.wal_path.read_text().splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash mid-write
+            if entry["op"] == "save":
+                if entry["memory"]["id"] in flushed:
+                    # already flushed before the WAL was truncated
+                    self._memories.setdefault(entry["memory"]["id"], entry["memory"])
+                    continue
+                embeddings = np.frombuffer(base64.b64decode(entry["embeddings"]), dtype=np.float32)
+                self._apply_save(entry["memory"], entry["chunks"], embeddings.reshape(-1, EMBEDDING_DIM))
+            elif entry["op"] == "delete":
+                if entry["id"] not in self._memories:
+                    continue  # already deleted in the flushed files
+                self._apply_delete(entry["id"])
+            replayed = True
+        if replayed:
+            self._save()
+        self.wal_path.unlink(missing_ok=True)
+
+    def _log_wal(self, entry: dict):
+        """Append one change to the WAL so it survives a crash before the next flush."""
+        with open(self.wal_path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def _mark_dirty(self):
+        """Schedule a flush, coalescing changes that arrive within FLUSH_DELAY."""
+        self._dirty = True
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(FLUSH_DELAY, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        """Write pending changes to the data files and truncate the WAL."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return
+            self._save()
+            self.wal_path.unlink(missing_ok=True)
+            self._dirty = False
 
     def _save(self):
-        """Save memories and chunks to parquet."""
-        self._memories.to_parquet(self.memories_path, index=False)
-        self._chunks.to_parquet(self.chunks_path, index=False)
+        """Write a new generation of chunk files, then publish it through memories.parquet."""
+        generation = time.time_ns()
+        chunks_path, embeddings_path, quantized_path = self._chunk_paths(generation)
+        np.save(embeddings_path, self._embeddings)
+        np.save(quantized_path, self._embeddings_i8)
+        if self._epoch is None:
+            self._epoch = generation
+            if self._index is not None:
+                self._save_index()  # built after a delete, before the rows had an epoch
+        table = pa.Table.from_pylist(self._chunk_rows, schema=CHUNKS_SCHEMA.with_metadata({NORMALIZED_KEY: b"1"}))
+        pq.write_table(table, chunks_path)
+        # memories.parquet goes last, via rename: a reader sees either the old
+        # generation or the new one, never chunk files from two flushes
+        schema = MEMORIES_SCHEMA.with_metadata({
+            GENERATION_KEY: str(generation).encode(),
+            EPOCH_KEY: str(self._epoch).encode(),
+        })
+        tmp_path = self.memories_path.with_suffix(".parquet.tmp")
+        pq.write_table(pa.Table.from_pylist(list(self._memories.values()), schema=schema), tmp_path)
+        os.replace(tmp_path, self.memories_path)
+        self._generation = generation
+        self._remove_old_generations()
+
+    def _remove_old_generations(self):
+        """Delete chunk files other than the current generation's, and older epochs' indexes.
+
+        A live memmap of a deleted .npy (here or in another process) stays valid,
+        and a reader that loses the race to open one retries with the new generation.
+        """
+        current = {*self._chunk_paths(self._generation), self._index_path}
+        for pattern in ("chunks*.parquet", "chunk_embeddings*.npy", "chunk_index*.faiss"):
+            for path in self.data_dir.glob(pattern):
+                if path not in current:
+                    path.unlink(missing_ok=True)
+
+    def _save_index(self):
+        """Write the HNSW index via rename, so a reader never sees a partial file."""
+        if (path := self._index_path) is None:
+            return  # rows were deleted: _save() writes it once they have an epoch
+        tmp_path = path.with_suffix(".faiss.tmp")
+        faiss.write_index(self._index, str(tmp_path))
+        os.replace(tmp_path, path)
 
     def _embed(self, text: str) -> np.ndarray:
-        """Get embedding for text using OpenAI."""
+        """Get unit-norm embedding for text using OpenAI."""
         response = self.client.embeddings.create(
             model=EMBEDDING_MODEL,
             input=text,
         )
-        return np.array(response.data[0].embedding, dtype=np.float32)
-
-    def _embed_batch(self, texts: list[str]) -> list[np.ndarray]:
-        """Get embeddings for multiple texts in one API call."""
+        return normalize(np.array(response.data[0].embedding, dtype=np.float32))
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Embed a search query, reusing the embedding of an identical earlier query."""
+        with self._lock:
+            if (cached := self._query_cache.get(query)) is not None:
+                self._query_cache.move_to_end(query)
+                return np.frombuffer(cached, dtype=np.float32)
+        embedding = self._embed(query)
+        with self._lock:
+            self._query_cache[query] = embedding.tobytes()
+            while len(self._query_cache) > QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return embedding
+
+    def _load_query_cache(self):
+        try:
+            with open(self.query_cache_path, "rb") as f:
+                self._query_cache.update(pickle.load(f))
+        except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+            pass
+
+    def _save_query_cache(self):
+        with self._lock:
+            data = pickle.dumps(self._query_cache)
+        tmp_path = self.query_cache_path.with_suffix(".pkl.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, self.query_cache_path)
+        except OSError:
+            pass  # it's only a cache
+
+    def _embed_request(self, texts: list[str]) -> np.ndarray:
+        """Get unit-norm embeddings (one row per text) in one API call."""
         response = self.client.embeddings.create(
             model=EMBEDDING_MODEL,
             input=texts,
         )
-        return [np.array(e.embedding, dtype=np.float32) for e in response.data]
+        data = sorted(response.data, key=lambda e: e.index)
+        return normalize(np.array([e.embedding for e in data], dtype=np.float32))
+
+    def _embed_batch(self, texts: list[str]) -> np.ndarray:
+        """Get unit-norm embeddings for texts, sub-batched and fetched concurrently."""
+        if len(texts) <= EMBED_BATCH_SIZE:
+            return self._embed_request(texts)
+        groups = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+        # network-bound, so threads are enough; map() keeps results in input order
+        with ThreadPoolExecutor(max_workers=min(EMBED_CONCURRENCY, len(groups))) as pool:
+            return np.vstack(list(pool.map(self._embed_request, groups)))
 
     def save(self, content: str) -> str:
         """Save a memory with chunked embeddings."""
         self._load()
 
         memory_id = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-
-        # save memory
-        new_memory = pd.DataFrame([{
+        memory = {
             "id": memory_id,
             "content": content,
             "created_at": datetime.now().isoformat(),
-        }])
-        self._memories = pd.concat([self._memories, new_memory], ignore_index=True)
+        }
 
         # chunk and embed
         chunks = chunk_text(content)
         embeddings = self._embed_batch(chunks)
-
-        # save chunks
-        new_chunks = pd.DataFrame([
+        chunk_rows = [
             {
                 "memory_id": memory_id,
                 "chunk_index": i,
                 "chunk_text": chunk,
-                "embedding": emb,
             }
-            for i, (chunk, emb) in enumerate(zip(chunks, embeddings))
-        ])
-        self._chunks = pd.concat([self._chunks, new_chunks], ignore_index=True)
-
-        # update embedding matrix
-        new_emb_matrix = np.vstack(embeddings)
-        if len(self._chunk_embeddings) > 0:
-            self._chunk_embeddings = np.vstack([self._chunk_embeddings, new_emb_matrix])
-        else:
-            self._chunk_embeddings = new_emb_matrix
-
-        self._save()
+            for i, chunk in enumerate(chunks)
+        ]
+
+        with self._lock:
+            self._log_wal({
+                "op": "save",
+                "memory": memory,
+                "chunks": chunk_rows,
+                "embeddings": base64.b64encode(embeddings.tobytes()).decode(),
+            })
+            self._apply_save(memory, chunk_rows, embeddings)
+            self._mark_dirty()
         return memory_id
 
+    def _apply_save(self, memory: dict, chunk_rows: list[dict], embeddings: np.ndarray):
+        self._codes_cache = None
+        self._memories[memory["id"]] = memory
+        self._chunk_rows.extend(chunk_rows)
+        self._append_embeddings(embeddings)
+
     def search(self, query: str, threshold: float = SIMILARITY_THRESHOLD, min_results: int = MIN_RESULTS) -> list[dict]:
         """Search memories by chunk similarity. Returns full memories, scored by best chunk match."""
         self._load()
 
-        if len(self._chunks) == 0:
+        if len(self._chunk_rows) == 0:
             return []
 
-        query_embedding = self._embed(query)
-        similarities = self._chunk_embeddings @ query_embedding
-
-        # group by memory_id, take best chunk score per memory
-        chunk_df = self._chunks.copy()
-        chunk_df["similarity"] = similarities
-
-        # get best similarity per memory
-        best_per_memory = chunk_df.groupby("memory_id")["similarity"].max().reset_index()
-        best_per_memory = best_per_memory.sort_values("similarity", ascending=False)
+        query_embedding = self._embed_query(query)
+        if (index := self._ann_index()) is not None:
+            # large store: only the approximate nearest chunks are scored (exactly)
+            k = max(min_results * 4, RERANK_TOP_K)
+            with self._lock:
+                # set per search so it also covers an index read from disk
+                index.hnsw.efSearch = max(ANN_EF_SEARCH, 2 * k)
+                _, ids = index.search(query_embedding[None, :], k)
+            rows = ids[0][ids[0] >= 0]
+            chunk_similarities = similarities(self._embeddings[rows], query_embedding)
+        else:
+            rows = np.arange(self._emb_len)
+            # scan the int8 matrix, then re-score the best candidates exactly
+            chunk_similarities = approx_similarities(self._embeddings_i8, quantize(query_embedding))
+            if chunk_similarities is None:
+                chunk_similarities = similarities(self._embeddings, query_embedding)
+            else:
+                top = rows
+                if len(top) > RERANK_TOP_K:
+                    top = np.argpartition(chunk_similarities, -RERANK_TOP_K)[-RERANK_TOP_K:]
+                chunk_similarities[top] = similarities(self._embeddings[top], query_embedding)
+
+        # best chunk score per memory, memories without a scored chunk are left out
+        codes, memory_ids = self._memory_codes()
+        best = np.full(len(memory_ids), -np.inf, dtype=np.float32)
+        np.maximum.at(best, codes[rows], chunk_similarities)
+        scored = np.flatnonzero(np.isfinite(best))
+        order = scored[np.argsort(-best[scored], kind="stable")]
 
         results = []
-        for _, row in best_per_memory.iterrows():
-            sim = float(row["similarity"])
-            memory_id = row["memory_id"]
+        for code in order:
+            sim = float(best[code])
+            memory_id = memory_ids[code]
 
             if sim >= threshold or len(results) < min_results:
-                memory = self._memories[self._memories["id"] == memory_id].iloc[0]
+                memory = self._memories[memory_id]
                 results.append({
                     "id": memory_id,
                     "content": memory["content"],
@@ -190,25 +595,30 @@ class MemoryManager:
     def get_all(self) -> list[dict]:
         """Get all memories."""
         self._load()
-        return self._memories.to_dict("records") if len(self._memories) > 0 else []
+        return [dict(m) for m in self._memories.values()]
 
     def delete(self, memory_id: str) -> bool:
         """Delete a memory and its chunks."""
         self._load()
 
-        # check exists
-        if memory_id not in self._memories["id"].values:
-            return False
-
-        # remove memory
-        self._memories = self._memories[self._memories["id"] != memory_id].reset_index(drop=True)
-
-        # remove chunks and rebuild embedding matrix
-        self._chunks = self._chunks[self._chunks["memory_id"] != memory_id].reset_index(drop=True)
-        if len(self._chunks) > 0:
-            self._chunk_embeddings = np.vstack(self._chunks["embedding"].values)
-        else:
-            self._chunk_embeddings = np.zeros((0, EMBEDDING_DIM))
+        with self._lock:
+            # check exists
+            if memory_id not in self._memories:
+                return False
 
-        self._save()
+            self._log_wal({"op": "delete", "id": memory_id})
+            self._apply_delete(memory_id)
+            self._mark_dirty()
         return True
+
+    def _apply_delete(self, memory_id: str):
+        self._codes_cache = None
+        # remove memory
+        del self._memories[memory_id]
+
+        # remove chunks and compact the embedding matrix
+        keep = np.array([c["memory_id"] != memory_id for c in self._chunk_rows], dtype=bool)
+        self._chunk_rows = [c for c, k in zip(self._chunk_rows, keep) if k]
+        self._set_embeddings(self._embeddings[keep])
+        self._index = None  # HNSW can't drop rows, rebuilt on the next large search
+        self._epoch = None  # and index files of the old rows no longer apply
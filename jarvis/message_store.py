@@ -1,56 +1,172 @@
 """Simple message store for tracking sent/received messages."""
 
-import json
+import asyncio
+import sqlite3
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
 
+import orjson
+
+FLUSH_INTERVAL = 0.5  # seconds between write-behind flushes
+FLUSH_BATCH_SIZE = 64  # pending messages that force an immediate flush
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_ts ON messages (ts);
+"""
+
 
 class MessageStore:
-    """Store messages keyed by message ID for reply context lookup."""
+    """Store messages keyed by message ID for reply context lookup.
+
+    Backed by SQLite in WAL mode, so scheduled tasks running in another
+    process can store messages while the server reads them.
+    """
 
     def __init__(self, data_dir: str = "data"):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
-        self.store_file = self.data_dir / "messages.json"
+        self.db_file = self.data_dir / "messages.db"
+        # Write-behind buffer filled by store_async(), drained by flush()
+        self._pending: dict[str, tuple] = {}
+        # Rows taken from the buffer whose flush hasn't committed yet; still
+        # visible to lookups so a redelivered webhook can't slip past dedup
+        self._flushing: dict[str, tuple] = {}
+        # One connection shared by the event loop and to_thread workers
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_file, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._migrate_legacy()
+
+    def _migrate_legacy(self):
+        """Import messages.json / messages.jsonl from older versions, then remove them."""
+        rows = []
+        legacy_json = self.data_dir / "messages.json"
+        legacy_jsonl = self.data_dir / "messages.jsonl"
+        if legacy_json.exists():
+            rows.extend({"id": msg_id, **msg} for msg_id, msg in orjson.loads(legacy_json.read_bytes()).items())
+        if legacy_jsonl.exists():
+            for line in legacy_jsonl.read_bytes().splitlines():
+                try:
+                    rows.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    continue
+        if not rows:
+            return
 
-    def _load(self) -> dict:
-        if self.store_file.exists():
-            return json.loads(self.store_file.read_text())
-        return {}
+        records = []
+        for msg in rows:
+            try:
+                ts = datetime.fromisoformat(msg["timestamp"]).timestamp()
+                records.append((msg["id"], msg["content"], msg["sender"], ts))
+            except (KeyError, ValueError):
+                continue
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)", records)
+        legacy_json.unlink(missing_ok=True)
+        legacy_jsonl.unlink(missing_ok=True)
 
-    def _save(self, data: dict):
-        self.store_file.write_text(json.dumps(data, indent=2))
+    @staticmethod
+    def _row(message_id: str, content: str, sender: str) -> tuple:
+        return (message_id, content, sender, datetime.now().timestamp())
 
-    def store(self, message_id: str, content: str, sender: str):
-        """Store a message for later lookup."""
-        data = self._load()
-        data[message_id] = {
+    @staticmethod
+    def _message(row: tuple) -> dict:
+        _, content, sender, ts = row
+        return {
             "content": content,
             "sender": sender,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.fromtimestamp(ts).isoformat(),
         }
-        self._save(data)
+
+    def _write_batch(self, rows: list[tuple]):
+        """Insert a batch of messages in one transaction."""
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?)", rows)
+
+    def store(self, message_id: str, content: str, sender: str):
+        """Store a message for later lookup."""
+        self._write_batch([self._row(message_id, content, sender)])
+
+    async def store_async(self, message_id: str, content: str, sender: str):
+        """Queue a message for the background flusher instead of writing it now."""
+        self._pending[message_id] = self._row(message_id, content, sender)
+        if len(self._pending) >= FLUSH_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        """Write all pending messages to disk in a single batch."""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._flushing.update(batch)
+        try:
+            await asyncio.to_thread(self._write_batch, list(batch.values()))
+        finally:
+            for message_id, row in batch.items():
+                # a later flush may have taken a newer row for the same id
+                if self._flushing.get(message_id) is row:
+                    del self._flushing[message_id]
+
+    async def run_flusher(self, interval: float = FLUSH_INTERVAL):
+        """Flush pending messages every `interval` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            await self.flush()
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._db.close()
+
+    def _buffered(self, message_id: str) -> tuple | None:
+        """Return a message that is pending or being flushed, newest first."""
+        row = self._pending.get(message_id)
+        return row if row is not None else self._flushing.get(message_id)
 
     def get(self, message_id: str) -> dict | None:
         """Get a message by ID."""
-        data = self._load()
-        return data.get(message_id)
+        return self.get_many([message_id]).get(message_id)
+
+    def get_many(self, message_ids: list[str]) -> dict[str, dict]:
+        """Get several messages by ID in one query."""
+        found = {}
+        missing = []
+        for message_id in message_ids:
+            if (row := self._buffered(message_id)) is not None:
+                found[message_id] = self._message(row)
+            else:
+                missing.append(message_id)
+        if not missing:
+            return found
+
+        placeholders = ",".join("?" * len(missing))
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, content, sender, ts FROM messages WHERE id IN ({placeholders})", missing
+            ).fetchall()
+        for row in rows:
+            found[row[0]] = self._message(row)
+        return found
 
     def is_processed(self, message_id: str) -> bool:
         """Check if a message has already been processed (for dedup)."""
-        data = self._load()
-        return message_id in data
+        if self._buffered(message_id) is not None:
+            return True
+        with self._lock:
+            row = self._db.execute("SELECT 1 FROM messages WHERE id = ?", (message_id,)).fetchone()
+        return row is not None
 
     def cleanup(self, days: int = 7):
         """Remove messages older than specified days."""
-        cutoff = datetime.now() - timedelta(days=days)
-        data = self._load()
-        cleaned = {}
-        for msg_id, msg in data.items():
-            try:
-                ts = datetime.fromisoformat(msg["timestamp"])
-                if ts > cutoff:
-                    cleaned[msg_id] = msg
-            except (KeyError, ValueError):
-                continue
-        self._save(cleaned)
+        cutoff = (datetime.now() - timedelta(days=days)).timestamp()
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM messages WHERE ts < ?", (cutoff,))
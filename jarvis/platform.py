@@ -1,6 +1,44 @@
 """Platform factory — picks WhatsApp or Telegram client based on PLATFORM env var."""
 
+import asyncio
 import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+MEDIA_CHUNK_SIZE = 1 << 16  # bytes per write when streaming a download to disk
+
+# Extensions for downloaded media (the transcription API infers the format from it)
+MEDIA_EXTENSIONS = {
+    "audio/ogg": ".ogg",
+    "audio/mpeg": ".mp3",
+    "audio/mp4": ".m4a",
+    "audio/wav": ".wav",
+    "audio/webm": ".webm",
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+}
+
+
+def media_extension(content_type: str) -> str:
+    return MEDIA_EXTENSIONS.get(content_type.split(";", 1)[0].strip(), "")
+
+
+async def stream_to_temp_file(response: httpx.Response, suffix: str = "", directory: Optional[Path] = None) -> str:
+    """Write a streamed response body to a new temp file, one chunk at a time. Returns its path."""
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    try:
+        # file object write() loops over partial writes; disk I/O stays off the event loop
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in response.aiter_bytes(MEDIA_CHUNK_SIZE):
+                await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
 
 
 def get_platform() -> str:
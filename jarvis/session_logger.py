@@ -1,17 +1,148 @@
 """Session logging for storing conversation history."""
 
+import asyncio
+import atexit
+import functools
+import json
+import logging
 import os
+import re
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Callable, Iterator, Optional, TextIO
+
+WRITE_BATCH_WINDOW = 0.1  # seconds the background writer collects entries before writing
+
+logger = logging.getLogger("jarvis")
+
+# Matches exchanges in markdown session files written before the JSONL sidecars
+LEGACY_MESSAGE_PATTERN = re.compile(
+    r"## (\d{2}:\d{2})\n\n"
+    r"\*(\w+)\*(?:\s*\[voice\])?: (.*?)\n\n"
+    r"\*jarvis\*: (.*?)(?=\n\n## |\Z)",
+    re.DOTALL
+)
+
+
+def reverse_readlines(path: Path, chunk_size: int = 8192) -> Iterator[bytes]:
+    """Yield the lines of a file last to first, reading it backwards in chunks."""
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        remainder = b""
+        while position > 0:
+            step = min(chunk_size, position)
+            position -= step
+            f.seek(position)
+            lines = (f.read(step) + remainder).split(b"\n")
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if remainder:
+            yield remainder
+
+
+def _close(*handles: TextIO):
+    for handle in handles:
+        handle.close()
 
 
 class SessionLogger:
-    """Log conversation sessions to files with auto-cleanup."""
+    """Log conversation sessions to files with auto-cleanup.
+
+    Each markdown session file has a JSONL sidecar (same stem) with one record
+    per exchange, which is what get_last_n_messages reads.
+
+    Writes go straight to the files unless start() was called from a running
+    event loop (the server does this in its lifespan); then they're queued and
+    written in batches by a background task, so handlers never wait on disk.
+    """
 
     def __init__(self, sessions_dir: str = "data/sessions"):
         self.sessions_dir = Path(sessions_dir)
         self.sessions_dir.mkdir(parents=True, exist_ok=True)
-        self._active_sessions: dict[str, str] = {}  # user_id -> filepath
+        # user_id -> (filepath, markdown handle, jsonl handle), kept open for the session
+        self._active_sessions: dict[str, tuple[Path, TextIO, TextIO]] = {}
+        # user_id -> incoming message waiting for its response (for the jsonl record)
+        self._pending_incoming: dict[str, dict] = {}
+        # days -> (names and mtimes of the files in the window, sessions read from them)
+        self._recent_cache: dict[int, tuple[tuple, list[dict]]] = {}
+        # (handle, text) writes and (None, callable) file operations, in order
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        atexit.register(self._close_all)
+
+    def start(self):
+        """Start the background writer (call from within the event loop)."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._writer = asyncio.create_task(self._writer_loop())
+
+    async def stop(self):
+        """Write everything still queued and stop the background writer.
+
+        Never raises: callers are shutting down or about to exit for a restart.
+        """
+        if self._queue is None:
+            return
+        self._queue.put_nowait((None, None))
+        try:
+            await self._writer
+        except Exception:
+            logger.exception("Session log writer failed")
+        finally:
+            self._queue = self._writer = None
+
+    async def _writer_loop(self):
+        while True:
+            items = [await self._queue.get()]
+            try:
+                await asyncio.sleep(WRITE_BATCH_WINDOW)
+            finally:
+                # also runs when cancelled, so nothing taken off the queue is lost
+                while not self._queue.empty():
+                    items.append(self._queue.get_nowait())
+                stop = (None, None) in items
+                try:
+                    self._apply(items)
+                except Exception:
+                    # a full disk or closed handle loses this batch, not the writer
+                    logger.exception("Failed to write session log batch")
+            if stop:
+                return
+
+    @staticmethod
+    def _apply(items: list[tuple]):
+        """Write a batch with one write per file, skipping the stop sentinel."""
+        batched: dict[TextIO, list[str]] = {}
+
+        def write_batched():
+            for f, parts in batched.items():
+                f.write("".join(parts))
+            batched.clear()
+
+        for target, payload in items:
+            if target is not None:
+                batched.setdefault(target, []).append(payload)
+                continue
+            # file operations must see every write queued before them
+            write_batched()
+            if payload is not None:
+                payload()
+        write_batched()
+
+    def _write(self, f: TextIO, text: str):
+        if self._queue is None:
+            f.write(text)
+        else:
+            self._queue.put_nowait((f, text))
+
+    def _defer(self, operation: Callable[[], None]):
+        """Run a file operation now, or after the queued writes when batching."""
+        if self._queue is None:
+            operation()
+        else:
+            self._queue.put_nowait((None, operation))
 
     def log_incoming(
         self,
@@ -22,27 +153,22 @@ class SessionLogger:
     ):
         """Log an incoming message immediately (before processing)."""
         timestamp = datetime.now()
-        session_file = self._get_session_file(user_id, timestamp)
+        f, _ = self._get_session_file(user_id, timestamp)
         time_str = timestamp.strftime("%H:%M")
         voice_marker = " [voice]" if is_voice else ""
 
-        entry = f"\n## {time_str}\n\n*{user_name}*{voice_marker}: {message}\n"
-
-        with open(session_file, "a") as f:
-            f.write(entry)
+        self._write(f, f"\n## {time_str}\n\n*{user_name}*{voice_marker}: {message}\n")
+        self._pending_incoming[user_id] = self._record(timestamp, user_name, message, is_voice)
 
     def log_response(self, user_id: str, response: str):
         """Log jarvis's response (appended after the incoming message)."""
         if user_id not in self._active_sessions:
             return
-        session_file = Path(self._active_sessions[user_id])
-        if not session_file.exists():
-            return
-
-        entry = f"\n*jarvis*: {response}\n"
-
-        with open(session_file, "a") as f:
-            f.write(entry)
+        _, f, records = self._active_sessions[user_id]
+        self._write(f, f"\n*jarvis*: {response}\n")
+        if (record := self._pending_incoming.pop(user_id, None)) is not None:
+            record["response"] = response
+            self._write(records, json.dumps(record) + "\n")
 
     def log_message(
         self,
@@ -60,7 +186,7 @@ class SessionLogger:
         timestamp = datetime.now()
 
         # Get or create session file for this user
-        session_file = self._get_session_file(user_id, timestamp)
+        f, records = self._get_session_file(user_id, timestamp)
 
         # Format the entry
         time_str = timestamp.strftime("%H:%M")
@@ -75,13 +201,15 @@ class SessionLogger:
 """
 
         # Append to session file
-        with open(session_file, "a") as f:
-            f.write(entry)
+        self._write(f, entry)
+        record = self._record(timestamp, user_name, message, is_voice)
+        record["response"] = response
+        self._write(records, json.dumps(record) + "\n")
 
     def log_error(self, user_id: str, user_name: str, message: str, error: str):
         """Log an error that occurred while processing a message."""
         timestamp = datetime.now()
-        session_file = self._get_session_file(user_id, timestamp)
+        f, records = self._get_session_file(user_id, timestamp)
         time_str = timestamp.strftime("%H:%M")
 
         entry = f"""
@@ -91,30 +219,55 @@ class SessionLogger:
 
 *jarvis* [ERROR]: {error}
 """
-        with open(session_file, "a") as f:
-            f.write(entry)
-
-    def _get_session_file(self, user_id: str, timestamp: datetime) -> Path:
-        """Get the current session file, creating if needed."""
+        self._write(f, entry)
+        record = self._record(timestamp, user_name, message, False)
+        record["response"] = f"[ERROR]: {error}"
+        self._write(records, json.dumps(record) + "\n")
+
+    @staticmethod
+    def _record(timestamp: datetime, user_name: str, message: str, is_voice: bool) -> dict:
+        return {
+            "ts": timestamp.isoformat(timespec="seconds"),
+            "user": user_name,
+            "message": message,
+            "response": None,
+            "is_voice": is_voice,
+        }
+
+    def _get_session_file(self, user_id: str, timestamp: datetime) -> tuple[TextIO, TextIO]:
+        """Get the markdown and jsonl append handles of the current session, creating it if needed."""
         date_str = timestamp.strftime("%Y-%m-%d")
 
         # Check if we have an active session for today
         if user_id in self._active_sessions:
-            existing = Path(self._active_sessions[user_id])
-            if existing.exists() and existing.stem.startswith(date_str):
-                return existing
+            existing, f, records = self._active_sessions[user_id]
+            if existing.stem.startswith(date_str):
+                return f, records
+            self._defer(functools.partial(_close, f, records))
 
         # Create new session file (will be renamed when session ends)
         time_str = timestamp.strftime("%H-%M")
         filename = f"{date_str}_{time_str}_ongoing.md"
         filepath = self.sessions_dir / filename
 
+        f = open(filepath, "a", buffering=1)
         # Initialize with header
-        if not filepath.exists():
-            filepath.write_text(f"# Session {date_str}\n")
-
-        self._active_sessions[user_id] = str(filepath)
-        return filepath
+        if f.tell() == 0:
+            f.write(f"# Session {date_str}\n")
+        records = open(filepath.with_suffix(".jsonl"), "a", buffering=1)
+
+        self._active_sessions[user_id] = (filepath, f, records)
+        return f, records
+
+    def _close_all(self):
+        """Write anything still queued, then close every cached session handle (registered with atexit)."""
+        if self._queue is not None:
+            items = []
+            while not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            self._apply(items)
+        for _, f, records in self._active_sessions.values():
+            _close(f, records)
 
     def end_session(self, user_id: str):
         """
@@ -123,7 +276,13 @@ class SessionLogger:
         if user_id not in self._active_sessions:
             return
 
-        filepath = Path(self._active_sessions[user_id])
+        filepath, f, records = self._active_sessions.pop(user_id)
+        self._pending_incoming.pop(user_id, None)
+        self._defer(functools.partial(self._finish_session, filepath, f, records))
+
+    @staticmethod
+    def _finish_session(filepath: Path, f: TextIO, records: TextIO):
+        _close(f, records)
         if not filepath.exists():
             return
 
@@ -137,8 +296,9 @@ class SessionLogger:
             new_stem = stem.replace("_ongoing", f"_{end_time}")
             new_path = filepath.with_stem(new_stem)
             filepath.rename(new_path)
-
-        del self._active_sessions[user_id]
+            sidecar = filepath.with_suffix(".jsonl")
+            if sidecar.exists():
+                sidecar.rename(new_path.with_suffix(".jsonl"))
 
     def cleanup_old_sessions(self, days: int = 3):
         """Remove session files older than specified days."""
@@ -152,6 +312,7 @@ class SessionLogger:
 
                 if file_date < cutoff:
                     filepath.unlink()
+                    filepath.with_suffix(".jsonl").unlink(missing_ok=True)
             except (ValueError, IndexError):
                 # Skip files with unexpected format
                 continue
@@ -160,10 +321,11 @@ class SessionLogger:
         """
         Get recent session summaries for context.
 
-        Returns list of dicts with 'date', 'file', 'preview' keys.
+        Returns list of dicts with 'date', 'file', 'path', 'full_content' keys.
+        Cached until a session file in the window is added, renamed or written to.
         """
         cutoff = datetime.now() - timedelta(days=days)
-        sessions = []
+        in_window = []
 
         for filepath in sorted(self.sessions_dir.glob("*.md"), reverse=True):
             try:
@@ -171,18 +333,30 @@ class SessionLogger:
                 file_date = datetime.strptime(date_str, "%Y-%m-%d")
 
                 if file_date >= cutoff:
-                    content = filepath.read_text()
-                    sessions.append({
-                        "date": date_str,
-                        "file": filepath.name,
-                        "path": str(filepath),
-                        "preview": content[:500] if len(content) > 500 else content,
-                        "full_content": content,
-                    })
-            except (ValueError, IndexError):
+                    in_window.append((filepath, date_str, filepath.stat().st_mtime_ns))
+            except (ValueError, IndexError, FileNotFoundError):
+                continue
+
+        signature = tuple((filepath.name, mtime) for filepath, _, mtime in in_window)
+        cached = self._recent_cache.get(days)
+        if cached is not None and cached[0] == signature:
+            return list(cached[1])
+
+        sessions = []
+        for filepath, date_str, _ in in_window:
+            try:
+                content = filepath.read_text()
+            except FileNotFoundError:
                 continue
+            sessions.append({
+                "date": date_str,
+                "file": filepath.name,
+                "path": str(filepath),
+                "full_content": content,
+            })
 
-        return sessions
+        self._recent_cache[days] = (signature, sessions)
+        return list(sessions)
 
     def get_all_recent_content(self, days: int = 3) -> str:
         """Get all recent session content as a single string."""
@@ -202,51 +376,63 @@ class SessionLogger:
 
         Returns list of dicts with 'timestamp', 'user', 'message', 'response' keys.
         """
-        import re
-
         all_messages = []
 
         # Get all session files, sorted by name (which includes date)
         session_files = sorted(self.sessions_dir.glob("*.md"), reverse=True)
 
-        # Pattern to match message blocks
-        pattern = re.compile(
-            r"## (\d{2}:\d{2})\n\n"
-            r"\*(\w+)\*(?:\s*\[voice\])?: (.*?)\n\n"
-            r"\*jarvis\*: (.*?)(?=\n\n## |\Z)",
-            re.DOTALL
-        )
-
         for filepath in session_files:
             if len(all_messages) >= n:
                 break
 
+            sidecar = filepath.with_suffix(".jsonl")
             try:
-                date_str = filepath.stem[:10]
-                content = filepath.read_text()
-
-                matches = list(pattern.finditer(content))
-                # Reverse to get most recent first within this file
-                for match in reversed(matches):
-                    if len(all_messages) >= n:
-                        break
-
-                    time_str = match.group(1)
-                    user = match.group(2)
-                    message = match.group(3).strip()
-                    response = match.group(4).strip()
-
-                    all_messages.append({
-                        "timestamp": f"{date_str} {time_str}",
-                        "user": user,
-                        "message": message,
-                        "response": response,
-                    })
-            except (ValueError, IndexError):
+                if sidecar.exists():
+                    # Most recent first: read records from the end, stop at n
+                    for line in reverse_readlines(sidecar):
+                        if len(all_messages) >= n:
+                            break
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue
+                        all_messages.append({
+                            "timestamp": record["ts"][:16].replace("T", " "),
+                            "user": record["user"],
+                            "message": record["message"],
+                            "response": record["response"],
+                        })
+                else:
+                    self._append_legacy_messages(filepath, all_messages, n)
+            except (ValueError, IndexError, KeyError):
                 continue
 
         return all_messages
 
+    @staticmethod
+    def _append_legacy_messages(filepath: Path, all_messages: list[dict], n: int):
+        """Parse exchanges out of a markdown session file that has no JSONL sidecar."""
+        date_str = filepath.stem[:10]
+        content = filepath.read_text()
+
+        matches = list(LEGACY_MESSAGE_PATTERN.finditer(content))
+        # Reverse to get most recent first within this file
+        for match in reversed(matches):
+            if len(all_messages) >= n:
+                break
+
+            time_str = match.group(1)
+            user = match.group(2)
+            message = match.group(3).strip()
+            response = match.group(4).strip()
+
+            all_messages.append({
+                "timestamp": f"{date_str} {time_str}",
+                "user": user,
+                "message": message,
+                "response": response,
+            })
+
     def format_last_n_messages(self, n: int = 20) -> str:
         """Get last N messages formatted as readable text."""
         messages = self.get_last_n_messages(n)
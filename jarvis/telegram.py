@@ -2,9 +2,16 @@
 
 import hmac
 import httpx
+import orjson
 import os
+from pathlib import Path
 from typing import Optional
 
+from .http_common import SSL_CONTEXT
+from .platform import media_extension, stream_to_temp_file
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
 
 class TelegramClient:
     """Client for Telegram Bot API."""
@@ -14,8 +21,15 @@ class TelegramClient:
     def __init__(self):
         self.bot_token = os.environ["TELEGRAM_BOT_TOKEN"]
         self.webhook_secret = os.environ.get("TELEGRAM_WEBHOOK_SECRET")
+        self._webhook_secret_bytes = self.webhook_secret.encode() if self.webhook_secret else b""
         self.api_url = f"{self.BASE_URL}/bot{self.bot_token}"
-        self._client = httpx.AsyncClient(timeout=30.0)
+        # HTTP/2 keep-alive, getFile and the file download then share one connection
+        self._client = httpx.AsyncClient(
+            http2=True,
+            verify=SSL_CONTEXT,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
 
     async def close(self):
         await self._client.aclose()
@@ -23,122 +37,53 @@ class TelegramClient:
     def verify_signature(self, payload: bytes, signature: str) -> bool:
         if not self.webhook_secret:
             return True
-        return hmac.compare_digest(signature, self.webhook_secret)
+        # Constant-time; bytes because compare_digest rejects non-ASCII str
+        return hmac.compare_digest(signature.encode(), self._webhook_secret_bytes)
 
     @staticmethod
     def parse_webhook_message(data: dict) -> Optional[dict]:
         """Parse incoming Telegram Update into normalized message_info dict."""
-        # Handle message or edited_message
-        message = data.get("message") or data.get("edited_message")
-
         # Handle message reactions
         if reaction_update := data.get("message_reaction"):
-            chat_id = str(reaction_update.get("chat", {}).get("id", ""))
-            user = reaction_update.get("user", {})
-            user_name = user.get("first_name", "")
-            reacted_msg_id = str(reaction_update.get("message_id", ""))
-            new_reaction = reaction_update.get("new_reaction", [])
-            emoji = new_reaction[0].get("emoji", "") if new_reaction else ""
-
-            return {
-                "from": chat_id,
-                "name": user_name,
-                "message_id": f"reaction_{reacted_msg_id}",
-                "timestamp": str(reaction_update.get("date", "")),
-                "type": "reaction",
-                "text": None,
-                "audio_id": None,
-                "image_id": None,
-                "image_caption": None,
-                "reply_to_message_id": None,
-                "reaction_emoji": emoji,
-                "reaction_message_id": reacted_msg_id,
-            }
+            reacted_msg_id = _id_str(reaction_update.get("message_id"))
+            new_reaction = reaction_update.get("new_reaction")
+            return _info(
+                _id_str((reaction_update.get("chat") or _EMPTY).get("id")),
+                (reaction_update.get("user") or _EMPTY).get("first_name", ""),
+                f"reaction_{reacted_msg_id}",
+                _id_str(reaction_update.get("date")),
+                "reaction",
+                reaction_emoji=new_reaction[0].get("emoji", "") if new_reaction else "",
+                reaction_message_id=reacted_msg_id,
+            )
 
+        # Handle message or edited_message
+        message = data.get("message") or data.get("edited_message")
         if not message:
             return None
 
-        chat_id = str(message.get("chat", {}).get("id", ""))
-        user = message.get("from", {})
-        user_name = user.get("first_name", "")
-        message_id = str(message.get("message_id", ""))
-        timestamp = str(message.get("date", ""))
-
-        # Reply context
-        reply_to_message_id = None
-        if reply_to := message.get("reply_to_message"):
-            reply_to_message_id = str(reply_to.get("message_id", ""))
-
         # Determine message type and extract content
-        if voice := message.get("voice"):
-            return {
-                "from": chat_id,
-                "name": user_name,
-                "message_id": message_id,
-                "timestamp": timestamp,
-                "type": "audio",
-                "text": None,
-                "audio_id": voice["file_id"],
-                "image_id": None,
-                "image_caption": None,
-                "reply_to_message_id": reply_to_message_id,
-                "reaction_emoji": None,
-                "reaction_message_id": None,
-            }
-
-        if audio := message.get("audio"):
-            return {
-                "from": chat_id,
-                "name": user_name,
-                "message_id": message_id,
-                "timestamp": timestamp,
-                "type": "audio",
-                "text": None,
-                "audio_id": audio["file_id"],
-                "image_id": None,
-                "image_caption": None,
-                "reply_to_message_id": reply_to_message_id,
-                "reaction_emoji": None,
-                "reaction_message_id": None,
-            }
-
-        if photo_list := message.get("photo"):
+        if media := message.get("voice") or message.get("audio"):
+            kind, fields = "audio", {"audio_id": media["file_id"]}
+        elif photo_list := message.get("photo"):
             # Use largest photo (last in array)
-            photo = photo_list[-1]
-            return {
-                "from": chat_id,
-                "name": user_name,
-                "message_id": message_id,
-                "timestamp": timestamp,
-                "type": "image",
-                "text": None,
-                "audio_id": None,
-                "image_id": photo["file_id"],
-                "image_caption": message.get("caption"),
-                "reply_to_message_id": reply_to_message_id,
-                "reaction_emoji": None,
-                "reaction_message_id": None,
-            }
-
-        # Text message
-        text = message.get("text")
-        if text is not None:
-            return {
-                "from": chat_id,
-                "name": user_name,
-                "message_id": message_id,
-                "timestamp": timestamp,
-                "type": "text",
-                "text": text,
-                "audio_id": None,
-                "image_id": None,
-                "image_caption": None,
-                "reply_to_message_id": reply_to_message_id,
-                "reaction_emoji": None,
-                "reaction_message_id": None,
-            }
-
-        return None
+            kind, fields = "image", {"image_id": photo_list[-1]["file_id"], "image_caption": message.get("caption")}
+        elif (text := message.get("text")) is not None:
+            kind, fields = "text", {"text": text}
+        else:
+            return None
+
+        # Reply context
+        reply_to = message.get("reply_to_message")
+        return _info(
+            _id_str((message.get("chat") or _EMPTY).get("id")),
+            (message.get("from") or _EMPTY).get("first_name", ""),
+            _id_str(message.get("message_id")),
+            _id_str(message.get("date")),
+            kind,
+            reply_to_message_id=_id_str(reply_to.get("message_id")) if reply_to else None,
+            **fields,
+        )
 
     async def send_text(self, to: str, text: str) -> dict:
         url = f"{self.api_url}/sendMessage"
@@ -148,12 +93,12 @@ class TelegramClient:
             "parse_mode": "Markdown",
         }
 
-        response = await self._client.post(url, json=payload)
+        response = await self._client.post(url, content=orjson.dumps(payload), headers=JSON_HEADERS)
         if not response.is_success:
             print(f"Telegram send_text error: {response.status_code} - {response.text}")
         response.raise_for_status()
 
-        data = response.json()
+        data = orjson.loads(response.content)
         msg_id = str(data.get("result", {}).get("message_id", ""))
         return {"messages": [{"id": msg_id}]}
 
@@ -169,26 +114,79 @@ class TelegramClient:
             print(f"Telegram send_audio_file error: {response.status_code} - {response.text}")
         response.raise_for_status()
 
-        result = response.json()
+        result = orjson.loads(response.content)
         msg_id = str(result.get("result", {}).get("message_id", ""))
         return {"messages": [{"id": msg_id}]}
 
-    async def download_media(self, file_id: str) -> tuple[bytes, str]:
-        # Get file path from Telegram
+    async def _file_url(self, file_id: str) -> tuple[str, str]:
+        """Resolve a file_id to its download URL and content type."""
         url = f"{self.api_url}/getFile"
         response = await self._client.get(url, params={"file_id": file_id})
         response.raise_for_status()
 
-        file_path = response.json()["result"]["file_path"]
-        content_type = _guess_content_type(file_path)
+        file_path = orjson.loads(response.content)["result"]["file_path"]
+        return f"{self.BASE_URL}/file/bot{self.bot_token}/{file_path}", _guess_content_type(file_path)
+
+    async def download_media(self, file_id: str) -> tuple[bytes, str]:
+        download_url, content_type = await self._file_url(file_id)
 
         # Download the file
-        download_url = f"{self.BASE_URL}/file/bot{self.bot_token}/{file_path}"
         response = await self._client.get(download_url)
         response.raise_for_status()
 
         return response.content, content_type
 
+    async def download_media_to_file(
+        self, file_id: str, directory: Optional[Path] = None, default_suffix: str = ""
+    ) -> tuple[str, str]:
+        """Stream a file to a temp file (in directory, if given). Returns (path, content_type).
+
+        default_suffix names the file when the content type has no known extension.
+        """
+        download_url, content_type = await self._file_url(file_id)
+
+        async with self._client.stream("GET", download_url) as response:
+            response.raise_for_status()
+            path = await stream_to_temp_file(response, media_extension(content_type) or default_suffix, directory)
+        return path, content_type
+
+
+_EMPTY: dict = {}
+
+# Every message_info has the same keys, most of them None for any one message type
+_BLANK = {
+    "from": None,
+    "name": None,
+    "message_id": None,
+    "timestamp": None,
+    "type": None,
+    "text": None,
+    "audio_id": None,
+    "image_id": None,
+    "image_caption": None,
+    "reply_to_message_id": None,
+    "reaction_emoji": None,
+    "reaction_message_id": None,
+}
+
+
+def _info(chat_id: str, name: str, message_id: str, timestamp: str, kind: str, **fields) -> dict:
+    info = _BLANK.copy()
+    info["from"] = chat_id
+    info["name"] = name
+    info["message_id"] = message_id
+    info["timestamp"] = timestamp
+    info["type"] = kind
+    info.update(fields)
+    return info
+
+
+def _id_str(value) -> str:
+    """Telegram ids are ints; missing ones become "" as before."""
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
 
 def _guess_content_type(file_path: str) -> str:
     ext = file_path.rsplit(".", 1)[-1].lower() if "." in file_path else ""
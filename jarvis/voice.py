@@ -1,5 +1,6 @@
 """Voice handling: transcription with OpenAI and TTS with ElevenLabs."""
 
+import asyncio
 import os
 import tempfile
 from pathlib import Path
@@ -7,6 +8,15 @@ from pathlib import Path
 from openai import AsyncOpenAI
 from elevenlabs import AsyncElevenLabs
 
+from .platform import media_extension
+
+
+def write_temp_file(data: bytes, suffix: str) -> str:
+    """Write bytes to a named temp file and return its path."""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        f.write(data)
+        return f.name
+
 
 class VoiceHandler:
     """Handle voice transcription and text-to-speech."""
@@ -18,31 +28,24 @@ class VoiceHandler:
 
     async def transcribe(self, audio_data: bytes, content_type: str = "audio/ogg") -> str:
         """Transcribe audio using OpenAI gpt-4o-transcribe."""
-        # Determine file extension from content type
-        ext_map = {
-            "audio/ogg": ".ogg",
-            "audio/mpeg": ".mp3",
-            "audio/mp4": ".m4a",
-            "audio/wav": ".wav",
-            "audio/webm": ".webm",
-        }
-        ext = ext_map.get(content_type, ".ogg")
-
         # Write to temp file (OpenAI API needs a file)
-        with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as f:
-            f.write(audio_data)
-            temp_path = f.name
+        ext = media_extension(content_type) or ".ogg"
+        temp_path = await asyncio.to_thread(write_temp_file, audio_data, ext)
 
         try:
-            with open(temp_path, "rb") as audio_file:
-                response = await self.openai.audio.transcriptions.create(
-                    model="gpt-4o-transcribe",
-                    file=audio_file,
-                )
-            return response.text
+            return await self.transcribe_file(temp_path)
         finally:
             Path(temp_path).unlink(missing_ok=True)
 
+    async def transcribe_file(self, path: str) -> str:
+        """Transcribe an audio file; its extension tells the API the format."""
+        with open(path, "rb") as audio_file:
+            response = await self.openai.audio.transcriptions.create(
+                model="gpt-4o-transcribe",
+                file=audio_file,
+            )
+        return response.text
+
     async def text_to_speech(self, text: str) -> tuple[bytes, str]:
         """
         Convert text to speech using ElevenLabs v3.
@@ -65,8 +68,6 @@ class VoiceHandler:
         audio_data = b"".join(audio_chunks)
 
         # Save to temp file for WhatsApp upload
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-            f.write(audio_data)
-            temp_path = f.name
+        temp_path = await asyncio.to_thread(write_temp_file, audio_data, ".mp3")
 
         return audio_data, temp_path
@@ -1,10 +1,54 @@
 """WhatsApp API client for sending and receiving messages."""
 
+import asyncio
 import hashlib
 import hmac
 import httpx
+import orjson
 import os
-from typing import Optional
+import random
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from .http_common import SSL_CONTEXT
+from .platform import MEDIA_CHUNK_SIZE, media_extension, stream_to_temp_file
+
+# Stand-in for missing webhook objects, never mutated
+_EMPTY: dict = {}
+
+# Fields shared by every outgoing message; send methods merge theirs on top
+BASE_PAYLOAD = {"messaging_product": "whatsapp", "recipient_type": "individual"}
+
+# Graph API calls retried on 429/5xx with exponential backoff (plus jitter)
+MAX_ATTEMPTS = 5
+MAX_RETRY_DELAY = 30.0
+
+SIGNATURE_LENGTH = len("sha256=") + 2 * hashlib.sha256().digest_size
+
+# One pooled HTTP/2 client per process, shared by every WhatsAppClient and the
+# scripts, so Graph API calls reuse connections instead of handshaking again
+_shared_client: Optional[httpx.AsyncClient] = None
+
+
+def get_shared_client() -> httpx.AsyncClient:
+    """Return the process-wide Graph API client, creating it on first use."""
+    global _shared_client
+    if _shared_client is None or _shared_client.is_closed:
+        _shared_client = httpx.AsyncClient(
+            http2=True,
+            verify=SSL_CONTEXT,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=60.0),
+        )
+    return _shared_client
+
+
+async def close_shared_client():
+    """Close the process-wide client (a later get_shared_client() opens a new one)."""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.aclose()
+        _shared_client = None
 
 
 class WhatsAppClient:
@@ -16,16 +60,39 @@ class WhatsAppClient:
         self.access_token = os.environ["WHATSAPP_ACCESS_TOKEN"]
         self.phone_number_id = os.environ["WHATSAPP_PHONE_NUMBER_ID"]
         self.verify_token = os.environ["WHATSAPP_VERIFY_TOKEN"]
+        self._verify_token_bytes = self.verify_token.encode()
         self.app_secret = os.environ.get("WHATSAPP_APP_SECRET")
-        self._client = httpx.AsyncClient(timeout=30.0)
+        self._app_secret_bytes = self.app_secret.encode() if self.app_secret else b""
+        # URLs and headers are the same for every call, built once here
+        self._messages_url = f"{self.BASE_URL}/{self.phone_number_id}/messages"
+        self._media_url = f"{self.BASE_URL}/{self.phone_number_id}/media"
+        self._auth_headers = {"Authorization": f"Bearer {self.access_token}"}
+        self._json_headers = {**self._auth_headers, "Content-Type": "application/json"}
+        # Caps in-flight Graph API calls so bursts stay under Meta's rate limits
+        self._semaphore = asyncio.Semaphore(int(os.environ.get("WHATSAPP_MAX_CONCURRENCY", "20")))
+
+    @property
+    def _client(self) -> httpx.AsyncClient:
+        return get_shared_client()
 
     async def close(self):
-        """Close the HTTP client."""
-        await self._client.aclose()
+        """Close the shared HTTP client."""
+        await close_shared_client()
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a Graph API request, retrying rate-limited and server errors."""
+        async with self._semaphore:
+            for attempt in range(MAX_ATTEMPTS):
+                response = await self._client.request(method, url, **kwargs)
+                retryable = response.status_code == 429 or response.status_code >= 500
+                if not retryable or attempt == MAX_ATTEMPTS - 1:
+                    return response
+                await asyncio.sleep(min(2 ** attempt, MAX_RETRY_DELAY) + random.random())
 
     def verify_webhook(self, mode: str, token: str, challenge: str) -> Optional[str]:
         """Verify webhook subscription request from Meta."""
-        if mode == "subscribe" and token == self.verify_token:
+        # mode is public, the token is compared in constant time
+        if mode == "subscribe" and hmac.compare_digest(token.encode(), self._verify_token_bytes):
             return challenge
         return None
 
@@ -34,151 +101,148 @@ class WhatsAppClient:
         if not self.app_secret:
             return True  # Skip verification if secret not configured
 
-        if not signature.startswith("sha256="):
+        # "sha256=" + 64 hex chars; compare the raw 32-byte digests
+        if len(signature) != SIGNATURE_LENGTH or not signature.startswith("sha256="):
+            return False
+        try:
+            received = bytes.fromhex(signature[7:])
+        except ValueError:
             return False
 
-        expected_sig = hmac.new(
-            self.app_secret.encode(),
-            payload,
-            hashlib.sha256,
-        ).hexdigest()
-
-        return hmac.compare_digest(f"sha256={expected_sig}", signature)
+        # a digest name keeps this on the one-shot OpenSSL HMAC, no Python HMAC object
+        expected = hmac.digest(self._app_secret_bytes, payload, "sha256")
+        return hmac.compare_digest(expected, received)
 
     async def send_text(self, to: str, text: str) -> dict:
         """Send a text message."""
-        url = f"{self.BASE_URL}/{self.phone_number_id}/messages"
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
         payload = {
-            "messaging_product": "whatsapp",
-            "recipient_type": "individual",
+            **BASE_PAYLOAD,
             "to": to,
             "type": "text",
             "text": {"body": text},
         }
 
-        response = await self._client.post(url, headers=headers, json=payload)
+        response = await self._request("POST", self._messages_url, headers=self._json_headers, content=orjson.dumps(payload))
         if not response.is_success:
             print(f"WhatsApp send_text error: {response.status_code} - {response.text}")
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
 
     async def send_audio(self, to: str, audio_url: str) -> dict:
         """Send an audio message via URL."""
-        url = f"{self.BASE_URL}/{self.phone_number_id}/messages"
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
         payload = {
-            "messaging_product": "whatsapp",
-            "recipient_type": "individual",
+            **BASE_PAYLOAD,
             "to": to,
             "type": "audio",
             "audio": {"link": audio_url},
         }
 
-        response = await self._client.post(url, headers=headers, json=payload)
+        response = await self._request("POST", self._messages_url, headers=self._json_headers, content=orjson.dumps(payload))
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
 
     async def upload_media(self, file_path: str, mime_type: str) -> str:
         """Upload media file and return media ID."""
-        url = f"{self.BASE_URL}/{self.phone_number_id}/media"
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-
-        with open(file_path, "rb") as f:
-            files = {
-                "file": (os.path.basename(file_path), f, mime_type),
-                "messaging_product": (None, "whatsapp"),
-                "type": (None, mime_type),
-            }
-            response = await self._client.post(url, headers=headers, files=files)
+        # Read off the event loop; httpx buffers the multipart body either way
+        content = await asyncio.to_thread(Path(file_path).read_bytes)
+        files = {
+            "file": (os.path.basename(file_path), content, mime_type),
+            "messaging_product": (None, "whatsapp"),
+            "type": (None, mime_type),
+        }
+        response = await self._request("POST", self._media_url, headers=self._auth_headers, files=files)
 
         response.raise_for_status()
-        return response.json()["id"]
+        return orjson.loads(response.content)["id"]
 
     async def send_audio_by_id(self, to: str, media_id: str) -> dict:
         """Send an audio message using uploaded media ID."""
-        url = f"{self.BASE_URL}/{self.phone_number_id}/messages"
-        headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
         payload = {
-            "messaging_product": "whatsapp",
-            "recipient_type": "individual",
+            **BASE_PAYLOAD,
             "to": to,
             "type": "audio",
             "audio": {"id": media_id},
         }
 
-        response = await self._client.post(url, headers=headers, json=payload)
+        response = await self._request("POST", self._messages_url, headers=self._json_headers, content=orjson.dumps(payload))
         response.raise_for_status()
-        return response.json()
+        return orjson.loads(response.content)
 
     async def send_audio_file(self, to: str, file_path: str) -> dict:
         """Upload and send audio from a file path."""
         media_id = await self.upload_media(file_path, "audio/mpeg")
         return await self.send_audio_by_id(to, media_id)
 
-    async def download_media(self, media_id: str) -> tuple[bytes, str]:
-        """Download media file by ID. Returns (content, content_type)."""
-        # First get the media URL
-        url = f"{self.BASE_URL}/{media_id}"
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-
-        response = await self._client.get(url, headers=headers)
+    async def _lookup_media_url(self, media_id: str) -> str:
+        response = await self._request("GET", f"{self.BASE_URL}/{media_id}", headers=self._auth_headers)
         response.raise_for_status()
-        media_url = response.json()["url"]
+        return orjson.loads(response.content)["url"]
 
-        # Then download the actual file
-        response = await self._client.get(media_url, headers=headers)
-        response.raise_for_status()
-
-        content_type = response.headers.get("content-type", "audio/ogg")
-        return response.content, content_type
+    async def download_media(self, media_id: str) -> tuple[bytes, str]:
+        """Download media file by ID. Returns (content, content_type)."""
+        content = bytearray()
+
+        async def sink(chunk: bytes):
+            content.extend(chunk)
+
+        content_type = await self.download_media_stream(media_id, sink)
+        return bytes(content), content_type
+
+    async def download_media_stream(self, media_id: str, sink: Callable[[bytes], Awaitable[None]]) -> str:
+        """Stream media by ID into sink, one chunk at a time. Returns the content type."""
+        media_url = await self._lookup_media_url(media_id)
+        async with self._semaphore, self._client.stream("GET", media_url, headers=self._auth_headers) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(MEDIA_CHUNK_SIZE):
+                await sink(chunk)
+            return response.headers.get("content-type", "audio/ogg")
+
+    async def download_media_to_file(
+        self, media_id: str, directory: Optional[Path] = None, default_suffix: str = ""
+    ) -> tuple[str, str]:
+        """Stream media to a temp file (in directory, if given). Returns (path, content_type).
+
+        default_suffix names the file when the content type has no known extension.
+        """
+        media_url = await self._lookup_media_url(media_id)
+        async with self._semaphore, self._client.stream("GET", media_url, headers=self._auth_headers) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "audio/ogg")
+            path = await stream_to_temp_file(response, media_extension(content_type) or default_suffix, directory)
+        return path, content_type
 
     @staticmethod
     def parse_webhook_message(data: dict) -> Optional[dict]:
         """Parse incoming webhook data and extract message info."""
         try:
-            entry = data.get("entry", [{}])[0]
-            changes = entry.get("changes", [{}])[0]
-            value = changes.get("value", {})
-            messages = value.get("messages", [])
-
+            value = data["entry"][0]["changes"][0].get("value") or _EMPTY
+            # Most webhooks are delivery/read receipts, drop those before anything else
+            messages = value.get("messages")
             if not messages:
                 return None
 
             message = messages[0]
-            contact = value.get("contacts", [{}])[0]
-
-            # Extract reply context if this is a reply to another message
-            context = message.get("context", {})
-            reply_to_message_id = context.get("id")  # ID of the message being replied to
-
-            # Extract reaction info if this is a reaction
-            reaction = message.get("reaction", {})
-            reaction_emoji = reaction.get("emoji")
-            reaction_message_id = reaction.get("message_id")  # ID of the message being reacted to
+            get = message.get
+            message_type = get("type")
+            # The message's content sits under a key named after its type
+            body = (get(message_type) or _EMPTY) if message_type else _EMPTY
+            contact = (value.get("contacts") or (_EMPTY,))[0]
+            # the message being replied to, if any
+            context = get("context")
 
             return {
-                "from": message.get("from"),
-                "name": contact.get("profile", {}).get("name"),
-                "message_id": message.get("id"),
-                "timestamp": message.get("timestamp"),
-                "type": message.get("type"),
-                "text": message.get("text", {}).get("body"),
-                "audio_id": message.get("audio", {}).get("id"),
-                "image_id": message.get("image", {}).get("id"),
-                "image_caption": message.get("image", {}).get("caption"),
-                "reply_to_message_id": reply_to_message_id,
-                "reaction_emoji": reaction_emoji,
-                "reaction_message_id": reaction_message_id,
+                "from": get("from"),
+                "name": (contact.get("profile") or _EMPTY).get("name"),
+                "message_id": get("id"),
+                "timestamp": get("timestamp"),
+                "type": message_type,
+                "text": body.get("body") if message_type == "text" else None,
+                "audio_id": body.get("id") if message_type == "audio" else None,
+                "image_id": body.get("id") if message_type == "image" else None,
+                "image_caption": body.get("caption") if message_type == "image" else None,
+                "reply_to_message_id": context.get("id") if context else None,
+                "reaction_emoji": body.get("emoji") if message_type == "reaction" else None,
+                "reaction_message_id": body.get("message_id") if message_type == "reaction" else None,
             }
-        except (KeyError, IndexError):
+        except (KeyError, IndexError, TypeError, AttributeError):
             return None
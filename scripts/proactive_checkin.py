@@ -7,12 +7,16 @@ import os
 import sys
 from pathlib import Path
 
+import uvloop
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
 # Load .env before any imports that need env vars
 from dotenv import load_dotenv
-load_dotenv(Path(__file__).parent.parent / ".env")
+load_dotenv(PROJECT_ROOT / ".env")
 
 # Add parent directory to path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(PROJECT_ROOT))
 
 
 # JSON schema for structured output
@@ -51,8 +55,6 @@ def find_claude_cli() -> str | None:
 
 async def run_proactive_checkin(claude_path: str) -> dict:
     """Run the proactive check-in task through Claude."""
-    project_root = Path(__file__).parent.parent
-
     prompt = """You are running the proactive-checkin skill. Follow the SKILL.md instructions exactly.
 
 You have TWO jobs:
@@ -101,7 +103,7 @@ Output your decision via the structured response."""
         *args,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
-        cwd=str(project_root),
+        cwd=str(PROJECT_ROOT),
         env={**os.environ, "CLAUDE_CODE_DISABLE_NONESSENTIAL_TRAFFIC": "1"},
     )
 
@@ -176,4 +178,4 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    uvloop.run(main())
@@ -1,22 +1,25 @@
 #!/usr/bin/env python3
 """Re-subscribes WABA to the app and notifies on failure."""
 
-import asyncio
 import os
 import sys
 from pathlib import Path
 
+import uvloop
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
 from dotenv import load_dotenv
-load_dotenv(Path(__file__).parent.parent / ".env")
+load_dotenv(PROJECT_ROOT / ".env")
 
-sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(PROJECT_ROOT))
 
 # WABA resubscription is WhatsApp-only
 if os.environ.get("PLATFORM", "whatsapp").lower() != "whatsapp":
     print("Skipping WABA resubscription (not on WhatsApp platform)")
     sys.exit(0)
 
-import httpx
+from jarvis.whatsapp import WhatsAppClient, close_shared_client, get_shared_client
 
 
 async def resubscribe() -> tuple[bool, str]:
@@ -27,18 +30,17 @@ async def resubscribe() -> tuple[bool, str]:
     if not waba_id or not token:
         return False, "WHATSAPP_WABA_ID and WHATSAPP_ACCESS_TOKEN must be set"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"https://graph.facebook.com/v21.0/{waba_id}/subscribed_apps",
-            headers={"Authorization": f"Bearer {token}"}
-        )
-        data = response.json()
+    response = await get_shared_client().post(
+        f"{WhatsAppClient.BASE_URL}/{waba_id}/subscribed_apps",
+        headers={"Authorization": f"Bearer {token}"}
+    )
+    data = response.json()
 
-        if data.get("success"):
-            return True, "WABA resubscribed successfully"
-        else:
-            error = data.get("error", {}).get("message", str(data))
-            return False, f"WABA resubscription failed: {error}"
+    if data.get("success"):
+        return True, "WABA resubscribed successfully"
+    else:
+        error = data.get("error", {}).get("message", str(data))
+        return False, f"WABA resubscription failed: {error}"
 
 
 async def notify_failure(message: str):
@@ -48,22 +50,24 @@ async def notify_failure(message: str):
         return
 
     try:
-        from jarvis.whatsapp import WhatsAppClient
         client = WhatsAppClient()
         await client.send_text(user_phone, f"hey, heads up - {message}")
-        await client.close()
     except Exception as e:
         print(f"Failed to send notification: {e}", file=sys.stderr)
 
 
 async def main():
-    success, message = await resubscribe()
-    print(message)
+    try:
+        success, message = await resubscribe()
+        print(message)
+        if not success:
+            await notify_failure(message)
+    finally:
+        await close_shared_client()
 
     if not success:
-        await notify_failure(message)
         sys.exit(1)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    uvloop.run(main())
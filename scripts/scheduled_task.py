@@ -3,18 +3,26 @@
 
 import argparse
 import asyncio
+import functools
 import os
 import sys
 from pathlib import Path
 
-# Load .env before any imports that need env vars
-from dotenv import load_dotenv
-load_dotenv(Path(__file__).parent.parent / ".env")
+import uvloop
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Load .env before any imports that need env vars (run_cronjob.sh usually has
+# already, so dotenv is only imported when there's a file to read)
+if (PROJECT_ROOT / ".env").exists():
+    from dotenv import load_dotenv
+    load_dotenv(PROJECT_ROOT / ".env")
 
 # Add parent directory to path
-sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(PROJECT_ROOT))
 
-from jarvis.cron import CronManager
+# Skip the CLI's update checks and telemetry at startup (inherited by the subprocess)
+os.environ.setdefault("CLAUDE_CODE_DISABLE_NONESSENTIAL_TRAFFIC", "1")
 
 
 async def run_claude_task(task_name: str, task_description: str, claude_path: str) -> str:
@@ -32,8 +40,6 @@ CRITICAL RULES FOR SCHEDULED TASKS:
 - Just do whatever work you need silently using tools, then output ONLY the final message
 - Stay in character as jarvis"""
 
-    project_root = Path(__file__).parent.parent
-
     # Disallowed tools (same as main runner - block dangerous operations)
     disallowed_tools = [
         "Read(*.env*)",
@@ -52,30 +58,40 @@ CRITICAL RULES FOR SCHEDULED TASKS:
         "--disallowedTools", *disallowed_tools,
     ]
 
+    # One CLI process per task, like the main runner: the CLI has no
+    # server/socket mode to keep a warm worker around
     process = await asyncio.create_subprocess_exec(
         *args,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE,
-        cwd=str(project_root),
+        cwd=str(PROJECT_ROOT),
     )
 
-    stdout, stderr = await process.communicate()
+    # Read both pipes concurrently in 64 KiB chunks and join once at the end
+    stdout_chunks: list[bytes] = []
+    stderr_chunks: list[bytes] = []
+    await asyncio.gather(
+        drain(process.stdout, stdout_chunks),
+        drain(process.stderr, stderr_chunks),
+    )
+    await process.wait()
 
     if process.returncode != 0:
-        return f"Task failed: {stderr.decode()}"
+        return f"Task failed: {b''.join(stderr_chunks).decode()}"
+
+    return b"".join(stdout_chunks).decode()
+
 
-    return stdout.decode()
+async def drain(stream: asyncio.StreamReader, sink: list[bytes]):
+    """Collect a subprocess pipe until EOF."""
+    while chunk := await stream.read(65536):
+        sink.append(chunk)
 
 
 def write_to_news(task_name: str, result: str) -> bool:
     """Write task result to news.md for the next conversation to pick up."""
     from datetime import datetime
 
-    news_file = Path(__file__).parent.parent / "news.md"
-
-    if not news_file.exists():
-        return False
-
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
 
     # Format the news entry
@@ -86,13 +102,39 @@ def write_to_news(task_name: str, result: str) -> bool:
 
 """
 
-    # Append to news.md
-    with open(news_file, "a") as f:
-        f.write(entry)
-
+    # Append to news.md in a single O_APPEND write, so entries from cron jobs
+    # finishing at the same time don't interleave. No O_CREAT: news.md is
+    # opt-in, a missing file means nobody reads news
+    try:
+        fd = os.open(PROJECT_ROOT / "news.md", os.O_WRONLY | os.O_APPEND)
+    except FileNotFoundError:
+        return False
+    try:
+        os.write(fd, entry.encode())
+    finally:
+        os.close(fd)
     return True
 
 
+# Built once per process and shared by every notification it sends
+@functools.lru_cache(maxsize=None)
+def get_client():
+    from jarvis.platform import get_client
+    return get_client()
+
+
+@functools.lru_cache(maxsize=None)
+def get_message_store():
+    from jarvis.message_store import MessageStore
+    return MessageStore(PROJECT_ROOT / "data")
+
+
+@functools.lru_cache(maxsize=None)
+def get_session_logger():
+    from jarvis.session_logger import SessionLogger
+    return SessionLogger(PROJECT_ROOT / "data" / "sessions")
+
+
 async def send_notification(task_name: str, result: str) -> bool:
     """Send task result via messaging platform. Returns True if sent successfully."""
     user_phone = os.environ.get("USER_PHONE_NUMBER")
@@ -100,14 +142,7 @@ async def send_notification(task_name: str, result: str) -> bool:
         return False
 
     try:
-        from jarvis.platform import get_client
-        from jarvis.message_store import MessageStore
-        from jarvis.session_logger import SessionLogger
-
-        project_root = Path(__file__).parent.parent
         client = get_client()
-        message_store = MessageStore(project_root / "data")
-        session_logger = SessionLogger(project_root / "data" / "sessions")
 
         # Truncate if too long (safe for both platforms)
         max_len = 3500
@@ -116,14 +151,13 @@ async def send_notification(task_name: str, result: str) -> bool:
 
         message = result
         send_result = await client.send_text(user_phone, message)
-        await client.close()
 
         # Store message for reply context lookups
         if msg_id := send_result.get("messages", [{}])[0].get("id"):
-            message_store.store(msg_id, message, "jarvis")
+            get_message_store().store(msg_id, message, "jarvis")
 
         # Log to session history so it shows up in chat-history lookups
-        session_logger.log_message(
+        get_session_logger().log_message(
             user_id=user_phone,
             user_name="scheduled",
             message=f"[scheduled task: {task_name}]",
@@ -146,11 +180,14 @@ async def main_async(args):
 
     # Only notify if not silent
     if not args.silent:
-        # Write to news.md for async pickup by next conversation
-        wrote_news = write_to_news(args.name, result)
-
-        # Also send via messaging platform for immediate notification
-        sent = await send_notification(args.name, result)
+        # Write to news.md for async pickup by next conversation, and send via
+        # messaging platform for immediate notification; the two are independent
+        wrote_news, sent = await asyncio.gather(
+            asyncio.to_thread(write_to_news, args.name, result),
+            send_notification(args.name, result),
+        )
+        if get_client.cache_info().currsize:
+            await get_client().close()
 
     # Always print to stdout (for logging)
     print(f"Task '{args.name}' completed:")
@@ -162,6 +199,7 @@ async def main_async(args):
 
     # Remove if one-shot
     if args.one_shot:
+        from jarvis.cron import CronManager
         cron = CronManager()
         cron.remove_task(args.name)
         print(f"One-shot task '{args.name}' removed from crontab")
@@ -176,7 +214,7 @@ def main():
     parser.add_argument("--claude-path", required=True, help="Path to claude CLI")
     args = parser.parse_args()
 
-    asyncio.run(main_async(args))
+    uvloop.run(main_async(args))
 
 
 if __name__ == "__main__":
@@ -6,11 +6,17 @@ import os
 import sys
 from pathlib import Path
 
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
 from dotenv import load_dotenv
-load_dotenv(Path(__file__).parent.parent / ".env")
+load_dotenv(PROJECT_ROOT / ".env")
+
+sys.path.insert(0, str(PROJECT_ROOT))
 
 import httpx
 
+from jarvis.http_common import SSL_CONTEXT
+
 
 def main():
     parser = argparse.ArgumentParser(description="Set up Telegram webhook")
@@ -28,10 +34,12 @@ def main():
     if secret:
         payload["secret_token"] = secret
 
-    response = httpx.post(
-        f"https://api.telegram.org/bot{token}/setWebhook",
-        json=payload,
-    )
+    # Retries cover connect failures; the client is reused if more calls are added
+    with httpx.Client(transport=httpx.HTTPTransport(retries=3, verify=SSL_CONTEXT), timeout=10.0) as client:
+        response = client.post(
+            f"https://api.telegram.org/bot{token}/setWebhook",
+            json=payload,
+        )
 
     data = response.json()
     if data.get("ok"):
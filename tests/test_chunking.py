@@ -0,0 +1,31 @@
+import unittest
+
+from jarvis.memory import chunk_text
+
+
+class ChunkTextTest(unittest.TestCase):
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(chunk_text("  as is\n", chunk_size=20), ["  as is\n"])
+
+    def test_whitespace_between_sentences_becomes_one_space(self):
+        text = "First line.\n\nSecond   line here.\nThird one!  Fourth?"
+        self.assertEqual(
+            chunk_text(text, chunk_size=30, overlap=10),
+            ["First line. Second   line here.", "here. Third one! Fourth?"],
+        )
+
+    def test_without_overlap_chunks_start_on_sentences(self):
+        self.assertEqual(
+            chunk_text("One. Two. Three. Four. Five.", chunk_size=12, overlap=0),
+            ["One. Two.", "Three. Four.", "Five."],
+        )
+
+    def test_overlap_starts_at_a_word_boundary(self):
+        text = "alpha beta gamma delta. epsilon zeta eta theta."
+        first, second = chunk_text(text, chunk_size=30, overlap=12)
+        self.assertEqual(first, "alpha beta gamma delta.")
+        self.assertEqual(second, "delta. epsilon zeta eta theta.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,225 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import numpy as np
+
+from jarvis import memory
+from jarvis.memory import EMBEDDING_DIM, MemoryManager, normalize
+
+
+def fake_embeddings(texts: list[str]) -> np.ndarray:
+    rng = np.random.default_rng(len(texts))
+    return normalize(rng.random((len(texts), EMBEDDING_DIM), dtype=np.float32))
+
+
+class MemoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.data_dir = Path(self.tmp.name)
+
+    def manager(self) -> MemoryManager:
+        manager = MemoryManager(self.data_dir)
+        manager._embed_batch = fake_embeddings
+        manager._embed = lambda text: fake_embeddings([text])[0]
+        self.addCleanup(manager.flush)
+        return manager
+
+
+class WalReplayTest(MemoryTestCase):
+    def test_replay_after_crash_between_save_and_truncate(self):
+        manager = self.manager()
+        kept = manager.save("keep this one")
+        dropped = manager.save("delete this one")
+        manager.flush()
+        manager.delete(dropped)
+        # keep the WAL around as if the process died after _save() in flush()
+        wal = manager.wal_path.read_text()
+        manager.flush()
+        manager.wal_path.write_text(wal)
+
+        reloaded = self.manager()
+        self.assertEqual([m["id"] for m in reloaded.get_all()], [kept])
+        self.assertFalse(reloaded.wal_path.exists())
+
+    def test_replay_is_idempotent_for_saves(self):
+        manager = self.manager()
+        memory_id = manager.save("only once")
+        wal = manager.wal_path.read_text()
+        manager.flush()
+        manager.wal_path.write_text(wal)
+
+        reloaded = self.manager()
+        self.assertEqual([m["id"] for m in reloaded.get_all()], [memory_id])
+        self.assertEqual(len(reloaded._chunk_rows), reloaded._emb_len)
+
+    def test_replay_after_crash_between_file_writes(self):
+        manager = self.manager()
+        kept = manager.save("flushed earlier")
+        manager.flush()
+        added = manager.save("flushed halfway")
+        write_table = memory.pq.write_table
+        written = []
+
+        def crash_on_last_table(table, path, *args, **kwargs):
+            # the first parquet file lands, the process dies before the second
+            if written:
+                raise OSError("disk full")
+            written.append(path)
+            return write_table(table, path, *args, **kwargs)
+
+        with mock.patch.object(memory.pq, "write_table", crash_on_last_table):
+            with self.assertRaises(OSError):
+                manager.flush()
+        self.assertTrue(manager.wal_path.exists())
+
+        reloaded = self.manager()
+        self.assertEqual([m["id"] for m in reloaded.get_all()], [kept, added])
+        self.assertEqual([r["memory_id"] for r in reloaded._chunk_rows], [kept, added])
+        self.assertEqual(reloaded._emb_len, 2)
+
+    def test_torn_last_line_is_ignored(self):
+        manager = self.manager()
+        manager._load()
+        entry = json.dumps({"op": "delete", "id": "missing"})
+        manager.wal_path.write_text(entry + "\n" + entry[:10])
+        self.assertEqual(self.manager().get_all(), [])
+
+
+class StoreFilesTest(MemoryTestCase):
+    def chunk_files(self) -> list[str]:
+        return sorted(p.name for p in self.data_dir.iterdir() if p.name.startswith("chunk") and "faiss" not in p.name)
+
+    def test_reader_during_a_flush_sees_the_previous_generation(self):
+        writer = self.manager()
+        first = writer.save("first")
+        writer.flush()
+        writer.save("second")
+        write_table = memory.pq.write_table
+        seen = []
+
+        def read_before_publish(table, path, *args, **kwargs):
+            if Path(path).name.startswith("memories"):
+                # the new chunk files and .npy are on disk, memories.parquet isn't yet
+                reader = MemoryManager(self.data_dir)
+                reader._embed = writer._embed
+                reader._load_files()  # what's on disk, without replaying the writer's WAL
+                results = reader.search("anything")
+                seen.append(([r["id"] for r in results], len(reader._chunk_rows), reader._emb_len))
+            return write_table(table, path, *args, **kwargs)
+
+        with mock.patch.object(memory.pq, "write_table", read_before_publish):
+            writer.flush()
+        self.assertEqual(seen, [([first], 1, 1)])
+        self.assertEqual(len(self.manager().get_all()), 2)
+
+    def test_flush_removes_earlier_generations(self):
+        manager = self.manager()
+        manager.save("first")
+        manager.flush()
+        manager.save("second")
+        manager.flush()
+        generation = manager._generation
+        self.assertEqual(self.chunk_files(), sorted(p.name for p in manager._chunk_paths(generation)))
+
+    def test_unversioned_files_with_mismatched_rows_still_load(self):
+        manager = self.manager()
+        kept = manager.save("first")
+        manager.save("second")
+        manager.flush()
+        # the pre-generation layout, caught between the .npy and chunks.parquet writes
+        for new, old in zip(manager._chunk_paths(manager._generation), manager._chunk_paths(None)):
+            new.rename(old)
+        chunks_path = manager._chunk_paths(None)[0]
+        memory.pq.write_table(memory.pq.read_table(chunks_path).slice(0, 1), chunks_path)
+        memories = memory.pq.read_table(manager.memories_path)
+        memory.pq.write_table(memories.replace_schema_metadata(None), manager.memories_path)
+
+        with mock.patch.object(memory, "LOAD_RETRY_DELAY", 0):
+            reloaded = self.manager()
+            results = reloaded.search("anything")
+        self.assertEqual([r["id"] for r in results], [kept])
+        self.assertEqual(len(reloaded._chunk_rows), reloaded._emb_len)
+
+
+@unittest.skipIf(memory.faiss is None, "faiss not installed")
+class AnnIndexTest(MemoryTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(memory, "ANN_MIN_CHUNKS", 4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def index_files(self) -> list[Path]:
+        return sorted(self.data_dir.glob("chunk_index*.faiss"))
+
+    def no_rebuild(self):
+        return mock.patch.object(memory.faiss, "IndexHNSWFlat", side_effect=AssertionError("rebuilt"))
+
+    def test_index_is_persisted_when_built(self):
+        manager = self.manager()
+        for i in range(8):
+            manager.save(f"memory {i}")
+        manager.flush()
+        self.assertEqual(self.index_files(), [])
+        manager.search("memory")
+        self.assertEqual(self.index_files(), [manager._index_path])
+
+        reloaded = self.manager()
+        with self.no_rebuild():
+            reloaded.search("memory")
+        self.assertEqual(reloaded._index.ntotal, 8)
+
+    def test_index_behind_the_rows_is_extended(self):
+        searcher = self.manager()
+        for i in range(8):
+            searcher.save(f"memory {i}")
+        searcher.flush()
+        searcher.search("memory")
+        # the server saves more without ever loading the index
+        server = self.manager()
+        server.save("one more")
+        server.flush()
+        self.assertEqual(len(self.index_files()), 1)
+
+        reloaded = self.manager()
+        with self.no_rebuild(), mock.patch.object(memory, "ANN_SAVE_ROWS", 1):
+            reloaded.search("memory")
+        self.assertEqual(reloaded._index.ntotal, 9)
+        self.assertEqual(memory.faiss.read_index(str(reloaded._index_path)).ntotal, 9)
+
+    def test_index_file_is_dropped_after_delete(self):
+        manager = self.manager()
+        ids = [manager.save(f"memory {i}") for i in range(8)]
+        manager.search("memory")
+        manager.delete(ids[0])
+        manager.flush()
+        self.assertEqual(self.index_files(), [])
+
+        reloaded = self.manager()
+        reloaded.search("memory")
+        self.assertEqual(reloaded._index.ntotal, 7)
+
+    def test_index_built_after_a_delete_is_saved_on_flush(self):
+        manager = self.manager()
+        ids = [manager.save(f"memory {i}") for i in range(8)]
+        manager.flush()
+        manager.delete(ids[0])
+        manager.search("memory")
+        manager.flush()
+        self.assertEqual(self.index_files(), [manager._index_path])
+
+        reloaded = self.manager()
+        with self.no_rebuild():
+            reloaded.search("memory")
+        self.assertEqual(reloaded._index.ntotal, 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+
+from jarvis import session_logger
+from jarvis.session_logger import SessionLogger
+
+
+class FakeDatetime(datetime):
+    current = datetime(2025, 1, 1, 23, 59)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+class DayRolloverTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.sessions_dir = Path(self.tmp.name)
+        patcher = mock.patch.object(session_logger, "datetime", FakeDatetime)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rollover_with_writer_running(self):
+        logger = SessionLogger(self.sessions_dir)
+
+        async def run():
+            logger.start()
+            FakeDatetime.current = datetime(2025, 1, 1, 23, 59)
+            logger.log_message("user", "alice", "before midnight", "ok")
+            _, old_f, old_records = logger._active_sessions["user"]
+
+            FakeDatetime.current = datetime(2025, 1, 2, 0, 1)
+            logger.log_message("user", "alice", "after midnight", "ok")
+            _, new_f, new_records = logger._active_sessions["user"]
+
+            await logger.stop()
+            return old_f, old_records, new_f, new_records
+
+        old_f, old_records, new_f, new_records = asyncio.run(run())
+        self.addCleanup(logger._close_all)
+
+        # the previous day's handles are closed, the current ones stay usable
+        self.assertTrue(old_f.closed and old_records.closed)
+        self.assertFalse(new_f.closed or new_records.closed)
+
+        first = self.sessions_dir / "2025-01-01_23-59_ongoing.jsonl"
+        second = self.sessions_dir / "2025-01-02_00-01_ongoing.jsonl"
+        self.assertEqual(json.loads(first.read_text())["message"], "before midnight")
+        self.assertEqual(json.loads(second.read_text())["message"], "after midnight")
+
+    def test_rollover_without_writer(self):
+        logger = SessionLogger(self.sessions_dir)
+        self.addCleanup(logger._close_all)
+        FakeDatetime.current = datetime(2025, 1, 1, 23, 59)
+        logger.log_message("user", "alice", "before midnight", "ok")
+        _, old_f, _ = logger._active_sessions["user"]
+        FakeDatetime.current = datetime(2025, 1, 2, 0, 1)
+        logger.log_message("user", "alice", "after midnight", "ok")
+        _, new_f, _ = logger._active_sessions["user"]
+        self.assertTrue(old_f.closed)
+        self.assertFalse(new_f.closed)
+
+
+class WriterFailureTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.sessions_dir = Path(self.tmp.name)
+        patcher = mock.patch.object(session_logger, "datetime", FakeDatetime)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        FakeDatetime.current = datetime(2025, 1, 1, 12, 0)
+
+    def test_writer_survives_failed_batch(self):
+        logger = SessionLogger(self.sessions_dir)
+        self.addCleanup(logger._close_all)
+        apply = SessionLogger._apply
+        failed = []
+
+        def fail_once(items):
+            if not failed:
+                failed.append(items)
+                raise OSError("No space left on device")
+            apply(items)
+
+        async def run():
+            logger.start()
+            logger.log_message("user", "alice", "lost", "ok")
+            await asyncio.sleep(session_logger.WRITE_BATCH_WINDOW * 2)
+            logger.log_message("user", "alice", "kept", "ok")
+            await logger.stop()
+
+        with mock.patch.object(SessionLogger, "_apply", staticmethod(fail_once)), \
+                self.assertLogs("jarvis", "ERROR"):
+            asyncio.run(run())
+
+        self.assertTrue(failed)
+        self.assertIsNone(logger._queue)
+        records = (self.sessions_dir / "2025-01-01_12-00_ongoing.jsonl").read_text().splitlines()
+        self.assertEqual([json.loads(line)["message"] for line in records], ["kept"])
+
+
+if __name__ == "__main__":
+    unittest.main()